@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Mini Eval System"
@@ -11,21 +12,105 @@ class Settings(BaseSettings):
     MYSQL_SERVER: str = "localhost"
     MYSQL_PORT: int = 3306
     MYSQL_DB: str = "mini_eval"
+    # Full SQLAlchemy URL overriding the MySQL settings, e.g. sqlite:///data/mini_eval.db for local testing
+    DATABASE_URL: Optional[str] = None
+    # Connection pools (per engine: the sync one and the async one each get their own)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
     
     # Security
     SECRET_KEY: str = "YOUR_SECRET_KEY_HERE_CHANGE_IN_PROD"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Authenticated requests resolve users from a bounded TTL cache (0 disables it);
+    # with AUTH_CLAIMS_ONLY the signed token alone identifies the user
+    AUTH_USER_CACHE_TTL: float = 60.0
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_CLAIMS_ONLY: bool = False
+    # Threads hashing/verifying passwords off the request path
+    PASSWORD_HASH_WORKERS: int = 4
     
     # Storage
     UPLOAD_DIR: str = "data"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+
+    # Evaluator result writer
+    RESULT_BATCH_SIZE: int = 500
+    # zlib-compress stored raw outputs of at least this many bytes (run `python -m app.migrate` first on MySQL)
+    RESULT_COMPRESS_OUTPUT: bool = False
+    RESULT_COMPRESS_MIN_BYTES: int = 512
+    RESULT_FLUSH_INTERVAL: float = 1.0
+    PROGRESS_CHECKPOINT_INTERVAL: float = 2.0
+    PROGRESS_PUBLISH_INTERVAL: float = 0.5
+    # How often /tasks/{id}/events re-reads a task running outside this process
+    EVENTS_POLL_INTERVAL: float = 3.0
+    # Response cache (skips repeat LLM calls for identical deterministic requests)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_PATH: str = "data/response_cache.sqlite3"
+    RESPONSE_CACHE_TTL: float = 30 * 24 * 3600
+    RESPONSE_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+
+    # Offline re-scoring (None = one worker process per CPU)
+    RESCORE_CHUNK_SIZE: int = 5000
+    RESCORE_WORKERS: Optional[int] = None
+
+    # Adaptive concurrency (AIMD per model, up to MAX_FACTOR x concurrency_limit) and retries
+    ADAPTIVE_CONCURRENCY: bool = True
+    ADAPTIVE_CONCURRENCY_MAX_FACTOR: int = 4
+    MAX_RETRIES: int = 3
+    RETRY_BACKOFF_BASE: float = 0.5
+    RETRY_BACKOFF_MAX: float = 30.0
+
+    # Shared HTTP client pools (seconds)
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_READ_TIMEOUT: float = 120.0
+    HTTP_TOTAL_TIMEOUT: float = 300.0
+    HTTP_KEEPALIVE_TIMEOUT: float = 60.0
+    HTTP_DNS_CACHE_TTL: int = 300
+
+    # Where runs execute: "inprocess" (API background task) or "worker" (python -m app.worker)
+    EVALUATION_BACKEND: str = "inprocess"
+    SHARD_SIZE: int = 10000
+    SHARD_LEASE_SECONDS: int = 60
+    SHARD_MAX_ATTEMPTS: int = 5
+    SHARD_CLAIM_BATCH: int = 8
+    WORKER_SLOTS: int = 1
+    WORKER_POLL_INTERVAL: float = 2.0
+
+    # Re-enter runs left RUNNING by a previous process (disable when running several API workers)
+    RESUME_ON_STARTUP: bool = True
+
+    # Instrumentation: event loop lag sampling period for /metrics (0 disables),
+    # and where on-demand task profiles are written
+    METRICS_LOOP_LAG_INTERVAL: float = 0.5
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_MAX_SECONDS: float = 300.0
+
+    # Dataset fields whose values get their own accuracy breakdown in task analytics
+    ANALYTICS_GROUP_FIELDS: List[str] = ["tag", "tags", "category", "subject", "difficulty"]
 
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
+        if self.DATABASE_URL:
+            return self.DATABASE_URL
         return f"mysql+pymysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_SERVER}:{self.MYSQL_PORT}/{self.MYSQL_DB}"
 
+    @property
+    def ASYNC_DATABASE_URI(self) -> str:
+        # Same database through the asyncio driver
+        uri = self.SQLALCHEMY_DATABASE_URI
+        for sync_prefix, async_prefix in (("mysql+pymysql://", "mysql+aiomysql://"), ("sqlite://", "sqlite+aiosqlite://")):
+            if uri.startswith(sync_prefix):
+                return async_prefix + uri[len(sync_prefix):]
+        return uri
+
     class Config:
         env_file = ".env"
+        # .env is shared with the legacy app, whose keys aren't settings here
+        extra = "ignore"
 
 @lru_cache()
 def get_settings():
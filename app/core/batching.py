@@ -0,0 +1,75 @@
+import asyncio
+
+class MicroBatcher:
+    """Groups individual requests into batches by size or time window.
+
+    Callers ``await add(item)`` and get back their own element of the batch
+    result. A batch is submitted as soon as ``max_size`` items are waiting or
+    ``window`` seconds after its first item arrived, whichever comes first;
+    several batches may be in flight at once.
+    """
+
+    def __init__(self, submit, max_size: int, window: float):
+        # submit(items) -> list of results aligned with items
+        self._submit = submit
+        self.max_size = max_size
+        self.window = window
+        self._pending = []
+        self._timer = None
+        self._inflight = set()
+        self.batches = 0
+        self.items = 0
+
+    async def add(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self.batches += 1
+        self.items += len(batch)
+        task = asyncio.create_task(self._run(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self._submit([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in self._inflight:
+            task.cancel()
+        for _, future in self._pending:
+            future.cancel()
+        self._pending = []
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "window_ms": self.window * 1000,
+            "batches": self.batches,
+            "avg_batch_size": self.items / self.batches if self.batches else 0,
+            "in_flight": len(self._inflight),
+            "waiting": len(self._pending),
+        }
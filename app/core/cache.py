@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+from app.config import get_settings
+
+class ResponseCache:
+    """Content-addressed on-disk cache of chat completion responses.
+
+    Entries are keyed on a hash of the endpoint and the full request payload
+    (model, messages, temperature, max_tokens), stored in a local SQLite file
+    and evicted by age (``ttl_seconds``) and total size (``max_bytes``,
+    least recently used first).
+    """
+
+    # Run size/TTL eviction after this many inserts
+    EVICT_EVERY = 1000
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " raw_output TEXT NOT NULL,"
+            " tokens INTEGER NOT NULL,"
+            " latency_ms REAL NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " prompt_tokens INTEGER,"
+            " completion_tokens INTEGER)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(response_cache)")}
+        if "completion_tokens" not in columns:
+            # Entries from before token counts were split only know the total,
+            # which would mix units in the token stats; start over instead
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.execute("ALTER TABLE response_cache ADD COLUMN prompt_tokens INTEGER")
+            self._conn.execute("ALTER TABLE response_cache ADD COLUMN completion_tokens INTEGER")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_response_cache_accessed_at ON response_cache (accessed_at)"
+        )
+        self.evict()
+
+    @staticmethod
+    def make_key(api_base_url: str, body: bytes, variant: str = "") -> str:
+        """Key for a serialized request body; ``variant`` separates outputs post-processed differently."""
+        return hashlib.sha256(f"{api_base_url}\n{variant}\n".encode("utf-8") + body).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT raw_output, prompt_tokens, completion_tokens, tokens, latency_ms, created_at"
+                " FROM response_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            raw_output, prompt_tokens, completion_tokens, tokens, latency_ms, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return {
+            "raw_output": raw_output,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens": tokens,
+            "latency_ms": latency_ms,
+        }
+
+    def put(self, key: str, raw_output: str, prompt_tokens: Optional[int], completion_tokens: Optional[int],
+            tokens: int, latency_ms: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache"
+                " (key, raw_output, tokens, latency_ms, size, created_at, accessed_at, prompt_tokens, completion_tokens)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, raw_output, tokens, latency_ms, len(raw_output.encode("utf-8")), now, now,
+                 prompt_tokens, completion_tokens),
+            )
+            self._puts_since_evict += 1
+            due = self._puts_since_evict >= self.EVICT_EVERY
+        if due:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            self._puts_since_evict = 0
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            # Keep the most recently used entries that fit in max_bytes
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                " SELECT key FROM ("
+                "  SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS running"
+                "  FROM response_cache)"
+                " WHERE running > ?)",
+                (self.max_bytes,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+@lru_cache()
+def get_response_cache() -> ResponseCache:
+    settings = get_settings()
+    return ResponseCache(
+        settings.RESPONSE_CACHE_PATH,
+        ttl_seconds=settings.RESPONSE_CACHE_TTL,
+        max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    )
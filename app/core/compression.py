@@ -0,0 +1,45 @@
+import zlib
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+from app.core.stats import ERROR_PREFIXES
+
+# Leading byte of a compressed value; UTF-8 text never starts with NUL
+MARKER = b"\x00"
+
+def encode_text(value: str, compress: bool = False, min_bytes: int = 0) -> bytes:
+    data = value.encode("utf-8")
+    # Failures stay readable so their class can be taken from the first bytes
+    if compress and len(data) >= min_bytes and not value.startswith(ERROR_PREFIXES):
+        return MARKER + zlib.compress(data)
+    return data
+
+def decode_text(value):
+    if value is None or isinstance(value, str):
+        # Text columns from before the switch to binary come back as str
+        return value
+    value = bytes(value)
+    if value[:1] == MARKER:
+        return zlib.decompress(value[1:]).decode("utf-8")
+    return value.decode("utf-8")
+
+class CompressedText(TypeDecorator):
+    """Text kept as bytes, zlib-compressed once it reaches ``min_bytes`` when ``compress`` is on.
+
+    Reads decode either form, so compression can be switched on or off at any time.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, compress: bool = False, min_bytes: int = 512):
+        super().__init__()
+        self.compress = compress
+        self.min_bytes = min_bytes
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        return encode_text(value, self.compress, self.min_bytes)
+
+    def process_result_value(self, value, dialect):
+        return decode_text(value)
@@ -0,0 +1,160 @@
+import asyncio
+import random
+import time
+from collections import deque
+from app.config import get_settings
+
+settings = get_settings()
+
+# Statuses that mean "slow down and try again" rather than a real answer
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for one model endpoint.
+
+    The limit grows by roughly one slot per round-trip while requests succeed
+    and latency stays near the best of the last ``baseline_window`` successes,
+    and is halved (at most once per cooldown window) on 429/5xx or transport
+    errors. A Retry-After header pauses all new requests until it expires.
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = None,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0, baseline_window: int = 100):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit or initial, initial)
+        self.limit = float(initial)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.baseline_window = baseline_window
+        self.in_flight = 0
+        self.successes = 0
+        self.overloads = 0
+        # Minimum latency over the window; an all-time minimum would stay
+        # stuck on one lucky request after the endpoint's normal latency shifts
+        self.min_latency_ms = None
+        # (success number, latency) with increasing latencies: a sliding-window minimum
+        self._recent = deque()
+        self.history = deque(maxlen=200)
+        self._waiters = deque()
+        self._paused_until = 0.0
+        self._next_decrease = 0.0
+        self._record("initial")
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Sit out a Retry-After pause before taking a slot, so a request
+            # cancelled while paused holds nothing
+            delay = self._paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            if self.in_flight < int(self.limit):
+                break
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Woken and cancelled before it could run: pass the slot on
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_success(self, latency_ms: float):
+        self.successes += 1
+        self._update_baseline(latency_ms)
+        # Latency well above the recent best means requests are queueing on
+        # the server: hold the limit instead of pushing further
+        if latency_ms > self.latency_tolerance * self.min_latency_ms:
+            return
+        before = int(self.limit)
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        if int(self.limit) != before:
+            self._record("increase")
+            self._wake()
+
+    def _update_baseline(self, latency_ms: float):
+        while self._recent and self._recent[-1][1] >= latency_ms:
+            self._recent.pop()
+        self._recent.append((self.successes, latency_ms))
+        while self._recent[0][0] <= self.successes - self.baseline_window:
+            self._recent.popleft()
+        self.min_latency_ms = self._recent[0][1]
+
+    def on_overload(self, retry_after: float = None):
+        self.overloads += 1
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        # One decrease per window: a burst of 429s from the same wave of
+        # requests is a single congestion signal
+        if now < self._next_decrease:
+            return
+        self._next_decrease = now + max(1.0, (self.min_latency_ms or 0) / 1000)
+        before = int(self.limit)
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        if int(self.limit) != before:
+            self._record("decrease")
+
+    def _record(self, reason: str):
+        self.history.append({"time": time.time(), "limit": int(self.limit), "reason": reason})
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "history": list(self.history),
+        }
+
+# One limiter per model, shared by every task that targets it
+_LIMITERS = {}
+
+def get_limiter(model) -> AdaptiveLimiter:
+    limiter = _LIMITERS.get(model.id)
+    if limiter is None:
+        initial = max(1, model.concurrency_limit)
+        max_limit = initial * settings.ADAPTIVE_CONCURRENCY_MAX_FACTOR if settings.ADAPTIVE_CONCURRENCY else initial
+        min_limit = 1 if settings.ADAPTIVE_CONCURRENCY else initial
+        limiter = AdaptiveLimiter(initial, min_limit=min_limit, max_limit=max_limit)
+        _LIMITERS[model.id] = limiter
+    return limiter
+
+def retry_delay(attempt: int, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(settings.RETRY_BACKOFF_MAX, settings.RETRY_BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        # HTTP-date form is rare for these APIs; fall back to normal backoff
+        return None
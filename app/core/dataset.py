@@ -0,0 +1,256 @@
+"""Dataset storage: the uploaded JSONL plus a preprocessed binary form.
+
+At upload every line is validated and appended to ``<name>.samples`` as a
+length-prefixed record::
+
+    <uint32 q_len><uint32 a_len><uint32 extra_len><q utf-8><a utf-8><extra json>
+
+``extra`` holds any fields besides ``q``/``a`` (empty when there are none).
+``<name>.idx`` is a flat array of native-endian uint64 record offsets, one
+per physical line of the original file (``BLANK`` for empty lines), so
+sample *k* is one index lookup and one slice of a memory-mapped file away.
+
+Uploads are stored by content: ``objects/<sha256>.jsonl`` plus its
+``.samples``/``.idx``, so the same file uploaded twice is kept once.
+"""
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import struct
+import uuid
+from array import array
+from collections import namedtuple
+
+RECORD_HEADER = struct.Struct("<III")
+BLANK = 0xFFFFFFFFFFFFFFFF
+INDEX_FLUSH_EVERY = 65536
+
+class DatasetSchemaError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid line(s) in dataset")
+
+def iter_jsonl(file_path, start=0, stop=None):
+    """Lazily yield ``(line_index, row)`` from a JSONL file, skipping blank lines.
+
+    ``line_index`` is the 0-based physical line number, which is the stable
+    key used to resume a run. Lines outside ``[start, stop)`` are skipped
+    without being parsed.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for index, line in enumerate(itertools.islice(f, start, stop), start):
+            line = line.strip()
+            if line:
+                yield index, json.loads(line)
+
+class DatasetWriter:
+    """Validates JSONL lines one at a time and writes the binary samples and index."""
+
+    def __init__(self, samples_path: str, index_path: str, max_errors: int = 20):
+        self.samples_path = samples_path
+        self.index_path = index_path
+        self.max_errors = max_errors
+        self.count = 0
+        self.errors = []
+        self._offset = 0
+        self._index = array("Q")
+        self._samples_file = open(samples_path, "wb")
+        self._index_file = open(index_path, "wb")
+
+    def add_line(self, raw: bytes):
+        line_no = self.count
+        self.count += 1
+        record = self._encode(line_no, raw)
+        if record is None:
+            self._index.append(BLANK)
+        else:
+            self._samples_file.write(record)
+            self._index.append(self._offset)
+            self._offset += len(record)
+        if len(self._index) >= INDEX_FLUSH_EVERY:
+            self._flush_index()
+
+    def _encode(self, line_no, raw):
+        raw = raw.strip()
+        if not raw:
+            return None
+        try:
+            row = json.loads(raw)
+        except ValueError as e:
+            return self._error(line_no, f"invalid JSON: {e}")
+        if not isinstance(row, dict):
+            return self._error(line_no, "expected a JSON object")
+        q = row.pop("q", None)
+        # Rows without an answer have always been accepted and score against ""
+        a = row.pop("a", None)
+        if not isinstance(q, str):
+            return self._error(line_no, "'q' must be a string")
+        if a is None:
+            a = ""
+        elif isinstance(a, (int, float)) and not isinstance(a, bool):
+            a = str(a)
+        if not isinstance(a, str):
+            return self._error(line_no, "'a' must be a string or number")
+        q_bytes = q.encode("utf-8")
+        a_bytes = a.encode("utf-8")
+        extra = json.dumps(row, ensure_ascii=False).encode("utf-8") if row else b""
+        return RECORD_HEADER.pack(len(q_bytes), len(a_bytes), len(extra)) + q_bytes + a_bytes + extra
+
+    def _error(self, line_no, message):
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_no + 1, "error": message})
+        else:
+            self.errors[-1] = {"line": line_no + 1, "error": "too many errors, stopping report"}
+        return None
+
+    def _flush_index(self):
+        self._index_file.write(self._index.tobytes())
+        self._index = array("Q")
+
+    def close(self):
+        """Finish writing; raises DatasetSchemaError if any line was invalid."""
+        self._flush_index()
+        self._samples_file.close()
+        self._index_file.close()
+        if self.errors:
+            raise DatasetSchemaError(self.errors)
+
+    def discard(self):
+        for f in (self._samples_file, self._index_file):
+            if not f.closed:
+                f.close()
+        for path in (self.samples_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+class DatasetReader:
+    """Random access to a preprocessed dataset through memory maps."""
+
+    def __init__(self, samples_path: str, index_path: str):
+        self._samples = self._map(samples_path)
+        self._index_map = self._map(index_path)
+        self._index = memoryview(self._index_map or b"").cast("Q")
+
+    @staticmethod
+    def _map(path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            # The mapping stays valid after the file object is closed
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._index.release()
+        for mapped in (self._samples, self._index_map):
+            if mapped is not None:
+                mapped.close()
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, index: int):
+        """Row for physical line ``index``, or None for a blank line."""
+        offset = self._index[index]
+        if offset == BLANK:
+            return None
+        q_len, a_len, extra_len = RECORD_HEADER.unpack_from(self._samples, offset)
+        pos = offset + RECORD_HEADER.size
+        row = {
+            "q": self._samples[pos:pos + q_len].decode("utf-8"),
+            "a": self._samples[pos + q_len:pos + q_len + a_len].decode("utf-8"),
+        }
+        if extra_len:
+            start = pos + q_len + a_len
+            row.update(json.loads(self._samples[start:start + extra_len]))
+        return row
+
+    def iter(self, start: int = 0, stop: int = None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            row = self.get(index)
+            if row is not None:
+                yield index, row
+
+def iter_dataset(dataset, start=0, stop=None):
+    """Yield ``(line_index, row)`` for a Dataset, preferring the preprocessed form."""
+    if dataset.samples_path and dataset.index_path:
+        with DatasetReader(dataset.samples_path, dataset.index_path) as reader:
+            yield from reader.iter(start, stop)
+    else:
+        # Datasets uploaded before preprocessing existed
+        yield from iter_jsonl(dataset.file_path, start, stop)
+
+StoredDataset = namedtuple("StoredDataset", "content_hash file_path samples_path index_path line_count")
+
+class DatasetIngest:
+    """Streams upload bytes into content-addressed storage.
+
+    ``feed()`` chunks of any size; the raw copy, the SHA-256 and the binary
+    samples/index are all produced in the same pass. Everything is written
+    under ``tmp/`` and only moved into ``objects/`` by ``finish()``, so a
+    failed or abandoned upload never leaves a half-written object behind.
+    """
+
+    def __init__(self, storage_dir: str):
+        self.storage_dir = storage_dir
+        os.makedirs(os.path.join(storage_dir, "tmp"), exist_ok=True)
+        os.makedirs(os.path.join(storage_dir, "objects"), exist_ok=True)
+        self._tmp = os.path.join(storage_dir, "tmp", uuid.uuid4().hex)
+        self._raw = open(f"{self._tmp}.jsonl", "wb")
+        self._hash = hashlib.sha256()
+        self._pending = b""
+        self.writer = DatasetWriter(f"{self._tmp}.samples", f"{self._tmp}.idx")
+
+    def feed(self, chunk: bytes):
+        self._raw.write(chunk)
+        self._hash.update(chunk)
+        lines = (self._pending + chunk).split(b"\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self.writer.add_line(line)
+
+    def finish(self) -> StoredDataset:
+        """Validate and store; raises DatasetSchemaError if any line was invalid."""
+        if self._pending:
+            self.writer.add_line(self._pending)
+            self._pending = b""
+        self._raw.close()
+        self.writer.close()
+        digest = self._hash.hexdigest()
+        target = os.path.join(self.storage_dir, "objects", digest)
+        stored = StoredDataset(digest, f"{target}.jsonl", f"{target}.samples", f"{target}.idx", self.writer.count)
+        if os.path.exists(stored.file_path):
+            self.discard()
+        else:
+            # The raw file goes last: its presence marks a complete object
+            os.replace(f"{self._tmp}.samples", stored.samples_path)
+            os.replace(f"{self._tmp}.idx", stored.index_path)
+            os.replace(f"{self._tmp}.jsonl", stored.file_path)
+        return stored
+
+    def discard(self):
+        if not self._raw.closed:
+            self._raw.close()
+        self.writer.discard()
+        if os.path.exists(f"{self._tmp}.jsonl"):
+            os.remove(f"{self._tmp}.jsonl")
+
+def ingest_file(path: str, storage_dir: str, chunk_size: int) -> StoredDataset:
+    """Run a file already on disk (e.g. an assembled resumable upload) through DatasetIngest."""
+    ingest = DatasetIngest(storage_dir)
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                ingest.feed(chunk)
+        return ingest.finish()
+    except Exception:
+        ingest.discard()
+        raise
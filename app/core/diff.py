@@ -0,0 +1,179 @@
+"""Paired comparison of two tasks run on the same dataset.
+
+Results are aligned on ``sample_index`` (the dataset line) through the
+``(task_id, sample_index)`` index. The summary is a single aggregate query:
+the 2x2 correctness table plus sums of latency and token deltas, so no rows
+leave the database. Flipped samples are streamed separately.
+"""
+import hashlib
+import json
+import math
+from datetime import datetime
+from sqlalchemy import and_, func, select
+from sqlmodel import Session
+from app.models import Dataset, EvaluationLog, EvaluationResult, TaskDiff, TaskStatus
+from app.core.samples import samples_join
+
+# Exact binomial McNemar test up to this many discordant pairs, chi-square above
+MCNEMAR_EXACT_LIMIT = 1000
+
+FLIP_FIELDS = (
+    "sample_index", "question", "ground_truth",
+    "a_is_correct", "b_is_correct", "a_extracted_answer", "b_extracted_answer",
+    "a_raw_output", "b_raw_output", "a_latency_ms", "b_latency_ms", "a_tokens_used", "b_tokens_used",
+)
+
+class DiffError(ValueError):
+    pass
+
+def _aligned():
+    results = EvaluationResult.__table__
+    a, b = results.alias("a"), results.alias("b")
+    return a, b, a.join(b, a.c.sample_index == b.c.sample_index)
+
+def mcnemar(regressed: int, improved: int) -> float:
+    """Two-sided p-value for "the two tasks are equally accurate" on paired samples."""
+    n = regressed + improved
+    if n == 0:
+        return 1.0
+    if n <= MCNEMAR_EXACT_LIMIT:
+        k = min(regressed, improved)
+        tail = sum(math.comb(n, i) for i in range(k + 1)) / 2 ** n
+        return min(1.0, 2 * tail)
+    chi2 = (abs(regressed - improved) - 1) ** 2 / n
+    return math.erfc(math.sqrt(chi2 / 2))
+
+def _paired(n, total, total_sq):
+    """Mean, standard deviation and normal-approximation p-value of paired deltas."""
+    if n == 0:
+        return {"mean": None, "std": None, "p_value": None}
+    mean = total / n
+    var = max(total_sq / n - mean * mean, 0.0) * n / (n - 1) if n > 1 else 0.0
+    std = math.sqrt(var)
+    if std == 0:
+        p_value = 1.0 if mean == 0 else 0.0
+    else:
+        p_value = math.erfc(abs(mean / (std / math.sqrt(n))) / math.sqrt(2))
+    return {"mean": mean, "std": std, "p_value": p_value}
+
+def compute_diff(session: Session, task_a: int, task_b: int) -> dict:
+    a, b, joined = _aligned()
+    latency = b.c.latency_ms - a.c.latency_ms
+    # Completion tokens: prompt tokens are the same on both sides of a pair
+    # and aren't known for streams closed early
+    tokens = (
+        func.coalesce(b.c.completion_tokens, b.c.tokens_used)
+        - func.coalesce(a.c.completion_tokens, a.c.tokens_used)
+    )
+    rows = session.execute(
+        select(
+            a.c.is_correct,
+            b.c.is_correct,
+            func.count(),
+            func.sum(latency),
+            func.sum(latency * latency),
+            func.sum(tokens),
+            func.sum(tokens * tokens),
+        )
+        .select_from(joined)
+        .where(a.c.task_id == task_a, b.c.task_id == task_b)
+        .group_by(a.c.is_correct, b.c.is_correct)
+    ).all()
+
+    cells = {(bool(x), bool(y)): n for x, y, n, *_ in rows}
+    n = sum(cells.values())
+    sums = [sum(row[i] or 0 for row in rows) for i in range(3, 7)]
+    regressed = cells.get((True, False), 0)
+    improved = cells.get((False, True), 0)
+    both_correct = cells.get((True, True), 0)
+    return {
+        "task_a": task_a,
+        "task_b": task_b,
+        "paired_samples": n,
+        "both_correct": both_correct,
+        "both_incorrect": cells.get((False, False), 0),
+        "regressed": regressed,
+        "improved": improved,
+        "accuracy_a": (both_correct + regressed) / n if n else None,
+        "accuracy_b": (both_correct + improved) / n if n else None,
+        "mcnemar_p_value": mcnemar(regressed, improved),
+        # Deltas are b - a: positive means task b was slower / used more tokens
+        "latency_delta_ms": _paired(n, sums[0], sums[1]),
+        "tokens_delta": _paired(n, sums[2], sums[3]),
+    }
+
+def _fingerprint(task: EvaluationLog) -> str:
+    # Changes whenever results are added or re-scored
+    state = f"{task.status}|{task.processed_samples}|{task.end_time}|{task.analytics_json or ''}"
+    return hashlib.sha1(state.encode("utf-8")).hexdigest()
+
+def load_pair(session: Session, task_a_id: int, task_b_id: int):
+    """Both tasks; LookupError if either (or its dataset) is missing, DiffError if their datasets differ."""
+    task_a = session.get(EvaluationLog, task_a_id)
+    task_b = session.get(EvaluationLog, task_b_id)
+    if not task_a or not task_b:
+        raise LookupError("Task not found")
+    if task_a.dataset_id != task_b.dataset_id:
+        dataset_a = session.get(Dataset, task_a.dataset_id)
+        dataset_b = session.get(Dataset, task_b.dataset_id)
+        if not dataset_a or not dataset_b:
+            raise LookupError("Dataset not found")
+        if dataset_a.content_hash is None or dataset_a.content_hash != dataset_b.content_hash:
+            raise DiffError("Tasks were run on different datasets")
+    return task_a, task_b
+
+def get_diff(session: Session, task_a_id: int, task_b_id: int) -> dict:
+    """Summary for a pair of tasks, served from TaskDiff while both are unchanged and finished."""
+    task_a, task_b = load_pair(session, task_a_id, task_b_id)
+
+    fingerprint = f"{_fingerprint(task_a)}:{_fingerprint(task_b)}"
+    cached = session.execute(
+        select(TaskDiff).where(TaskDiff.task_a_id == task_a_id, TaskDiff.task_b_id == task_b_id)
+    ).scalars().first()
+    if cached and cached.fingerprint == fingerprint:
+        return json.loads(cached.summary_json)
+
+    summary = compute_diff(session, task_a_id, task_b_id)
+    # Running tasks change under us; only finished pairs are worth keeping
+    if task_a.status == TaskStatus.COMPLETED and task_b.status == TaskStatus.COMPLETED:
+        cached = cached or TaskDiff(task_a_id=task_a_id, task_b_id=task_b_id)
+        cached.fingerprint = fingerprint
+        cached.summary_json = json.dumps(summary)
+        cached.computed_at = datetime.utcnow()
+        session.add(cached)
+        session.commit()
+    return summary
+
+def flips_query(task_a: int, task_b: int, kind: str = "all"):
+    """Samples whose correctness differs between the tasks, in dataset order.
+
+    ``kind`` is "regressed" (a correct, b not), "improved" (the reverse) or "all".
+    """
+    a, b, joined = _aligned()
+    joined, text = samples_join(joined, a, task_a)
+    if kind == "regressed":
+        flipped = and_(a.c.is_correct, ~b.c.is_correct)
+    elif kind == "improved":
+        flipped = and_(~a.c.is_correct, b.c.is_correct)
+    else:
+        flipped = a.c.is_correct != b.c.is_correct
+    return (
+        select(
+            a.c.sample_index,
+            text["question"],
+            text["ground_truth"],
+            a.c.is_correct.label("a_is_correct"),
+            b.c.is_correct.label("b_is_correct"),
+            a.c.extracted_answer.label("a_extracted_answer"),
+            b.c.extracted_answer.label("b_extracted_answer"),
+            a.c.raw_output.label("a_raw_output"),
+            b.c.raw_output.label("b_raw_output"),
+            a.c.latency_ms.label("a_latency_ms"),
+            b.c.latency_ms.label("b_latency_ms"),
+            a.c.tokens_used.label("a_tokens_used"),
+            b.c.tokens_used.label("b_tokens_used"),
+        )
+        .select_from(joined)
+        .where(a.c.task_id == task_a, b.c.task_id == task_b, flipped)
+        .order_by(a.c.sample_index)
+    )
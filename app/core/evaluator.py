@@ -1,180 +1,652 @@
 import asyncio
+import functools
 import json
-import re
 import time
-import aiohttp
+from collections import namedtuple
 from datetime import datetime
-from sqlmodel import Session, select
-from app.database import engine
+from sqlmodel import Session, func, select, update
+from app.config import get_settings
+from app.database import async_session, engine
 from app.models import EvaluationLog, EvaluationResult, LLMModel, Dataset, TaskStatus
+from app.core.sink import ResultSink
+from app.core.stats import RunningStats, error_class, sample_groups
+from app.core.pubsub import EventLog
+from app.core.cache import get_response_cache
+from app.core.scoring import answer_complete, score
+from app.core.http_client import http_clients
+from app.core.dataset import DatasetReader, iter_dataset
+from app.core.batching import MicroBatcher
+from app.core.prompts import RequestBuilder
+from app.core.samples import ensure_samples, sample_text
+from app.core.concurrency import RETRYABLE_STATUSES, get_limiter, parse_retry_after, retry_delay
+from app.core.metrics import REQUEST_ERRORS, REQUESTS, SAMPLES, STAGE_SECONDS, GaugeFunc
 
-# Regex for extracting "answer: X" or "\boxed{X}"
-# Priority: 1. "answer:\s*(.*)" 2. "\\boxed\{(.*?)\}"
-ANSWER_PATTERNS = [
-    re.compile(r"answer:\s*(.+?)(?:\n|$)", re.IGNORECASE),
-    re.compile(r"\\boxed\{(.+?)\}", re.IGNORECASE)
-]
+settings = get_settings()
+
+# Token counts of one response; prompt/completion are None when the server
+# doesn't report them separately
+Usage = namedtuple("Usage", "prompt completion total")
+NO_USAGE = Usage(None, 0, 0)
+
+# Request status for a 200 whose body can't be used; never retried
+INVALID_RESPONSE = "invalid"
+
+def parse_usage(usage: dict) -> Usage:
+    prompt = usage.get("prompt_tokens")
+    completion = usage.get("completion_tokens")
+    total = usage.get("total_tokens")
+    if total is None:
+        total = (prompt or 0) + (completion or 0)
+    return Usage(prompt, completion, total)
+
+def split_usage(usage: Usage, n: int):
+    """Spread one request's usage evenly over ``n`` outputs (remainders go to the first ones)."""
+    def shares(value):
+        if value is None:
+            return [None] * n
+        share, extra = divmod(value, n)
+        return [share + (1 if i < extra else 0) for i in range(n)]
+    return [Usage(*parts) for parts in zip(shares(usage.prompt), shares(usage.completion), shares(usage.total))]
+
+# Evaluators currently running in this process, keyed by task id
+ACTIVE_EVALUATORS = {}
+
+# Task ids a request has claimed for a run or re-score it scheduled, from the
+# moment it checked until that job ends. ACTIVE_EVALUATORS alone leaves a gap:
+# evaluators register only once run() has started
+RESERVED_TASKS = set()
+
+def reserve_task(task_id: int) -> bool:
+    """Claim a task for a job about to be scheduled; False if one is already running or scheduled here."""
+    if task_id in RESERVED_TASKS or task_id in ACTIVE_EVALUATORS:
+        return False
+    RESERVED_TASKS.add(task_id)
+    return True
+
+def release_task(task_id: int):
+    RESERVED_TASKS.discard(task_id)
+
+# Stage timers, bound once so an observation is just a bisect and two additions
+_limiter_wait = STAGE_SECONDS.labels("limiter_wait")
+_request_time = STAGE_SECONDS.labels("request")
+_decode_time = STAGE_SECONDS.labels("decode")
+_backoff_time = STAGE_SECONDS.labels("retry_backoff")
+_cache_time = STAGE_SECONDS.labels("cache_lookup")
+_score_time = STAGE_SECONDS.labels("score")
+_sink_time = STAGE_SECONDS.labels("sink")
+_sample_time = STAGE_SECONDS.labels("sample")
+
+def _limiter_gauge(key):
+    # Limiters are shared by every task on a model, so one value per model
+    def values():
+        return {
+            (evaluator.model_name,): evaluator.limiter.stats()[key]
+            for evaluator in list(ACTIVE_EVALUATORS.values()) if evaluator.limiter is not None
+        }
+    return values
+
+GaugeFunc("eval_active_tasks", "Tasks evaluating in this process", lambda: {(): len(ACTIVE_EVALUATORS)})
+GaugeFunc("eval_in_flight_requests", "Requests holding a concurrency slot, by model", _limiter_gauge("in_flight"), ["model"])
+GaugeFunc("eval_queued_requests", "Requests waiting for a concurrency slot, by model", _limiter_gauge("waiting"), ["model"])
+GaugeFunc("eval_concurrency_limit", "Current adaptive concurrency limit, by model", _limiter_gauge("limit"), ["model"])
+GaugeFunc(
+    "eval_queued_samples", "Parsed rows waiting for a worker, by task",
+    lambda: {(task_id,): e.queue.qsize() for task_id, e in list(ACTIVE_EVALUATORS.items()) if e.queue is not None},
+    ["task"],
+)
+GaugeFunc(
+    "eval_sink_backlog_rows", "Result rows buffered or being written, by task",
+    lambda: {(task_id,): e.sink.backlog for task_id, e in list(ACTIVE_EVALUATORS.items())},
+    ["task"],
+)
+
+# Parsed rows buffered ahead of the workers, per worker
+QUEUE_DEPTH_PER_WORKER = 2
+
+class CompletionBitmap:
+    """One bit per dataset line, set once that sample's result is stored."""
+
+    def __init__(self, size: int = 0):
+        self._bits = bytearray((size + 7) // 8)
+
+    def add(self, index: int):
+        byte = index >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte + 1 - len(self._bits)))
+        self._bits[byte] |= 1 << (index & 7)
+
+    def __contains__(self, index: int) -> bool:
+        byte = index >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (index & 7)))
 
 class AsyncEvaluator:
-    def __init__(self, task_id: int):
+    # Checkpoint even when no sample finished since the last one
+    checkpoint_when_idle = False
+
+    def __init__(self, task_id: int, resume: bool = False, line_range=None, feed=None):
         self.task_id = task_id
-        self.session_db = Session(engine)
+        self.resume = resume
+        # Optional [start, stop) slice of dataset lines to evaluate
+        self.line_range = line_range
+        # Optional asyncio.Queue of (line_index, row) ending with None, used
+        # instead of reading the dataset file (see app.core.fanout)
+        self.feed = feed
+        self.completed = CompletionBitmap()
+        self.cache = None
+        self.limiter = None
+        self.batcher = None
+        self.queue = None
+        self.model_name = None
+        self.requests = None
+        self._headers = None
+        self.retries = 0
+        # Async session for the task's own bookkeeping; bulk work uses the sync engine in threads
+        self.session_db = None
+        self.sink = ResultSink(
+            batch_size=settings.RESULT_BATCH_SIZE,
+            flush_interval=settings.RESULT_FLUSH_INTERVAL,
+        )
+        self.aggregates = RunningStats()
+        self.events = EventLog()
+        self._last_progress_publish = 0.0
+        # Set once earlier results are reloaded and the aggregates are complete
+        self.ready = False
 
-    def _get_task_context(self):
-        task = self.session_db.get(EvaluationLog, self.task_id)
+    async def _get_task_context(self):
+        task = await self.session_db.get(EvaluationLog, self.task_id)
         if not task:
             raise ValueError(f"Task {self.task_id} not found")
-        model = self.session_db.get(LLMModel, task.model_id)
-        dataset = self.session_db.get(Dataset, task.dataset_id)
+        model = await self.session_db.get(LLMModel, task.model_id)
+        dataset = await self.session_db.get(Dataset, task.dataset_id)
         return task, model, dataset
 
     async def run(self):
-        task, model, dataset = self._get_task_context()
+        self.session_db = async_session()
+        try:
+            task, model, dataset = await self._get_task_context()
+        except Exception:
+            await self.session_db.close()
+            raise
         
-        # Update status
-        task.status = TaskStatus.RUNNING
-        task.start_time = datetime.utcnow()
-        self.session_db.add(task)
-        self.session_db.commit()
+        await self._on_start(task, dataset)
 
+        self.model_name = model.name
+        ACTIVE_EVALUATORS[self.task_id] = self
+        # Started before setup: storing a large dataset's samples or reloading
+        # earlier results can outlast a shard lease, and heartbeats are checkpoints
+        checkpointer = asyncio.create_task(self._checkpoint_progress())
         try:
-            # Read Dataset
-            with open(dataset.file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            total = len(lines)
-            task.total_samples = total
-            self.session_db.add(task)
-            self.session_db.commit()
-
-            # Concurrency Control
-            semaphore = asyncio.Semaphore(model.concurrency_limit)
-            
-            async with aiohttp.ClientSession() as http_session:
-                tasks = []
-                for line in lines:
-                    data = json.loads(line)
-                    tasks.append(
-                        self.process_single_sample(
-                            http_session, semaphore, model, data
-                        )
+            total = task.total_samples
+
+            # Results only reference their line; the text is stored once per dataset
+            if not dataset.samples_stored:
+                await asyncio.to_thread(ensure_samples, dataset.id)
+            if self.resume:
+                await asyncio.to_thread(self._load_completed, total, task.cache_hits, task.cache_misses, dataset)
+            self.ready = True
+            if settings.RESPONSE_CACHE_ENABLED and task.use_cache:
+                self.cache = await asyncio.to_thread(get_response_cache)
+
+            # Concurrency Control: workers fed through a bounded queue, with the
+            # number actually in flight set by the model's adaptive limiter
+            # Templates and the constant part of the request body are built once
+            self.requests = RequestBuilder.from_task(task, model)
+            self._headers = {"Authorization": f"Bearer {model.api_key}", "Content-Type": "application/json"}
+
+            self.limiter = get_limiter(model)
+            # In batch mode a limiter slot carries a whole batch, so there
+            # must be enough workers to fill a batch for every slot
+            batch_size = max(1, model.batch_size)
+            concurrency = self.limiter.max_limit * batch_size
+            queue = self.queue = asyncio.Queue(maxsize=concurrency * QUEUE_DEPTH_PER_WORKER)
+
+            http_session = await http_clients.acquire(model.api_base_url, model.id, self.limiter.max_limit)
+            try:
+                if batch_size > 1:
+                    self.batcher = MicroBatcher(
+                        functools.partial(self._complete_batch, http_session, model),
+                        batch_size, model.batch_window_ms / 1000,
                     )
-                
-                # Run all tasks
-                results = await asyncio.gather(*tasks)
-
-            # Aggregation
-            correct_count = sum(1 for r in results if r['is_correct'])
-            total_latency = sum(r['latency_ms'] for r in results)
-            total_tokens = sum(r['tokens_used'] for r in results)
-            
-            task.status = TaskStatus.COMPLETED
-            task.end_time = datetime.utcnow()
-            task.processed_samples = total
-            task.accuracy = correct_count / total if total > 0 else 0
-            task.avg_latency_ms = total_latency / total if total > 0 else 0
-            task.avg_tokens = total_tokens / total if total > 0 else 0
-            
-            self.session_db.add(task)
-            self.session_db.commit()
+                async with self.sink:
+                    producer = asyncio.create_task(self._produce(queue, dataset, concurrency))
+                    workers = [
+                        asyncio.create_task(self._consume(queue, http_session, model))
+                        for _ in range(concurrency)
+                    ]
+                    try:
+                        await asyncio.gather(producer, *workers)
+                    finally:
+                        for t in (producer, *workers):
+                            t.cancel()
+            finally:
+                checkpointer.cancel()
+                if self.batcher is not None:
+                    self.batcher.close()
+                await http_clients.release(model.api_base_url, model.id, http_session)
+
+            await self._on_complete(task)
 
         except Exception as e:
-            task.status = TaskStatus.FAILED
             # In production, log specific error
             print(f"Task Failed: {e}")
-            self.session_db.add(task)
-            self.session_db.commit()
+            checkpointer.cancel()
+            await self._on_failure(task)
+        finally:
+            checkpointer.cancel()
+            self.events.publish("status", {"status": task.status, **self.aggregates.snapshot()})
+            self.events.close()
+            ACTIVE_EVALUATORS.pop(self.task_id, None)
+            await self.session_db.close()
+
+    async def _on_start(self, task, dataset):
+        # Update status
+        task.status = TaskStatus.RUNNING
+        if not (self.resume and task.start_time):
+            task.start_time = datetime.utcnow()
+        task.end_time = None
+        # Total is known from upload; samples are streamed lazily
+        task.total_samples = dataset.total_count
+        self.session_db.add(task)
+        await self.session_db.commit()
+
+    async def _on_complete(self, task):
+        # Aggregation
+        self._apply_aggregates(task)
+        task.status = TaskStatus.COMPLETED
+        task.end_time = datetime.utcnow()
+        task.total_samples = max(task.total_samples, self.aggregates.processed)
+        self.session_db.add(task)
+        await self.session_db.commit()
+
+    async def _on_failure(self, task):
+        task.status = TaskStatus.FAILED
+        # Keep whatever progress was made visible on the failed task
+        self._apply_aggregates(task)
+        self.session_db.add(task)
+        await self.session_db.commit()
+
+    def _load_completed(self, total, cache_hits=0, cache_misses=0, dataset=None):
+        # One streaming pass over the stored results rebuilds both the set of
+        # finished lines and the running aggregates, so only missing samples
+        # are re-requested and the final stats still cover the whole run
+        self.completed = CompletionBitmap(total)
+        statement = (
+            select(
+                EvaluationResult.sample_index,
+                EvaluationResult.is_correct,
+                EvaluationResult.instruction_followed,
+                EvaluationResult.latency_ms,
+                func.coalesce(EvaluationResult.completion_tokens, EvaluationResult.tokens_used),
+                # Enough of the output to classify failures
+                func.substr(EvaluationResult.raw_output, 1, 32),
+                EvaluationResult.ttft_ms,
+            )
+            .where(EvaluationResult.task_id == self.task_id)
+            .execution_options(yield_per=10000)
+        )
+        if self.line_range:
+            start, stop = self.line_range
+            statement = statement.where(
+                EvaluationResult.sample_index >= start, EvaluationResult.sample_index < stop
+            )
+        # Group fields aren't stored with results; they are looked up by line
+        # in the indexed dataset (datasets uploaded before indexing go without)
+        reader = None
+        if dataset is not None and dataset.index_path and settings.ANALYTICS_GROUP_FIELDS:
+            reader = DatasetReader(dataset.samples_path, dataset.index_path)
+        try:
+            with Session(engine) as session:
+                for index, is_correct, instruction_followed, latency, tokens, head, ttft in session.exec(statement):
+                    groups = None
+                    if index is not None:
+                        self.completed.add(index)
+                        if reader is not None and index < len(reader):
+                            groups = sample_groups(reader.get(index) or {}, settings.ANALYTICS_GROUP_FIELDS)
+                    self.aggregates.add(
+                        is_correct, instruction_followed, latency, tokens,
+                        error=error_class(head), groups=groups, ttft_ms=ttft,
+                    )
         finally:
-            self.session_db.close()
-
-    async def process_single_sample(self, http_session, semaphore, model, data):
-        async with semaphore:
-            q = data.get("q", "")
-            gt = data.get("a", "")
-            
-            start_ts = time.time()
-            # Enforce "Answer: " format in system prompt
-            system_prompt = "You are a helpful assistant. Please format your final answer starting with 'answer: '."
-            
-            payload = {
-                "model": model.model_name_identifier,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": q}
-                ],
-                "temperature": 0.0,
-                "max_tokens": 1024 
-            }
-            
-            raw_output = ""
-            tokens = 0
-            
+            if reader is not None:
+                reader.close()
+        # Which stored rows came from the cache isn't recorded per row
+        self.aggregates.cache_hits = cache_hits
+        self.aggregates.cache_misses = cache_misses
+
+    def _apply_aggregates(self, task):
+        for key, value in self.aggregates.columns().items():
+            setattr(task, key, value)
+
+    async def _checkpoint_progress(self):
+        # Throttled: at most one small UPDATE per interval, regardless of sample rate
+        last_processed = -1
+        while True:
+            await asyncio.sleep(settings.PROGRESS_CHECKPOINT_INTERVAL)
+            if not self.ready:
+                # Aggregates are still being reloaded; only keep-alives go out
+                if not self.checkpoint_when_idle:
+                    continue
+                values = None
+            elif self.aggregates.processed == last_processed and not self.checkpoint_when_idle:
+                continue
+            else:
+                last_processed = self.aggregates.processed
+                values = self._checkpoint_values()
             try:
-                headers = {"Authorization": f"Bearer {model.api_key}", "Content-Type": "application/json"}
-                async with http_session.post(f"{model.api_base_url}/chat/completions", json=payload, headers=headers) as resp:
-                    if resp.status == 200:
-                        resp_json = await resp.json()
-                        raw_output = resp_json['choices'][0]['message']['content']
-                        tokens = resp_json.get('usage', {}).get('total_tokens', 0)
-                    else:
-                        raw_output = f"Error: {resp.status} - {await resp.text()}"
+                await asyncio.to_thread(self._write_checkpoint, values)
             except Exception as e:
-                raw_output = f"Exception: {str(e)}"
-            
-            latency = (time.time() - start_ts) * 1000
-            
-            # Extraction & Scoring
-            extracted = self._extract_answer(raw_output)
-            instruction_followed = bool(re.search(r"answer:", raw_output, re.IGNORECASE))
-            is_correct = self._check_correctness(extracted, gt)
-            
-            # Save Result immediately (or batch if scaling higher)
-            # Creating a new session for thread-safety in async context if needed, 
-            # but here we use the shared one carefully or better, create one per db op.
-            # Ideally, we should batch inserts, but for now we'll do row-by-row for simplicity.
-            # NOTE: SQLModel Session is not thread-safe. We should create a new session here or pass a specific one.
-            # However, since we are in an async function running in gather, we need to be careful with blocking DB calls.
-            # Simplification: We return the dict and batch insert in the main thread/loop if possible, 
-            # OR use a separate Sync DB session inside a `run_in_executor` block.
-            # For this MVP, let's just return the data and let the main loop save it? 
-            # No, 'gather' waits for all. We want real-time updates.
-            # Solution: Use a local session for this insert.
-            
-            self._save_result(q, gt, raw_output, extracted, is_correct, instruction_followed, latency, tokens)
-            
-            return {
-                "is_correct": is_correct,
-                "latency_ms": latency,
-                "tokens_used": tokens
-            }
-
-    def _save_result(self, q, gt, raw, extracted, is_correct, instruction_followed, latency, tokens):
-        # Create a fresh session for this operation to avoid conflicts
+                print(f"Progress checkpoint failed: {e}")
+
+    def _checkpoint_values(self):
+        # Taken on the event loop so the writer thread gets a consistent copy
+        return self.aggregates.columns()
+
+    def _write_checkpoint(self, values):
+        # None: setup isn't done and there is no progress to record
+        if values is None:
+            return
         with Session(engine) as session:
-            result = EvaluationResult(
-                task_id=self.task_id,
-                question=q,
-                ground_truth=gt,
-                raw_output=raw,
-                extracted_answer=extracted,
-                is_correct=is_correct,
-                instruction_followed=instruction_followed,
-                latency_ms=latency,
-                tokens_used=tokens
+            session.exec(
+                update(EvaluationLog)
+                .where(EvaluationLog.id == self.task_id)
+                .values(**values)
             )
-            session.add(result)
             session.commit()
 
-    def _extract_answer(self, text):
-        for pattern in ANSWER_PATTERNS:
-            match = pattern.search(text)
-            if match:
-                return match.group(1).strip()
-        return text.strip() # Fallback to full text if no pattern found (or empty)
+    def stats(self) -> dict:
+        return {
+            "task_id": self.task_id,
+            "progress": self.aggregates.snapshot(),
+            "sink": self.sink.stats(),
+            "concurrency": self.limiter.stats() if self.limiter else None,
+            "batching": self.batcher.stats() if self.batcher else None,
+            "http_pools": http_clients.stats(),
+            "retries": self.retries,
+        }
+
+    async def _produce(self, queue, dataset, n_workers):
+        # Backpressure: put() blocks once the queue is full, so at most
+        # maxsize parsed rows are held in memory at any time
+        async for index, data in self._samples(dataset):
+            if index in self.completed:
+                continue
+            await queue.put((index, data))
+        for _ in range(n_workers):
+            await queue.put(None)
+
+    async def _samples(self, dataset):
+        if self.feed is None:
+            start, stop = self.line_range or (0, None)
+            for item in iter_dataset(dataset, start, stop):
+                yield item
+            return
+        while (item := await self.feed.get()) is not None:
+            if isinstance(item, Exception):
+                # The shared reader failed; fail this task like a local read error would
+                raise RuntimeError(f"Dataset reader failed: {item}") from item
+            yield item
+
+    async def _consume(self, queue, http_session, model):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, data = item
+            result = await self.process_single_sample(http_session, model, data, index)
+            self.aggregates.add(
+                result['is_correct'], result['instruction_followed'],
+                result['latency_ms'], result['tokens_used'], result['cached'],
+                result['error'], result['groups'], result['ttft_ms'], result['cache_miss'],
+            )
+            self._publish_progress()
+
+    def _publish_progress(self):
+        # Throttled so a fast run doesn't flood subscribers with snapshots
+        now = time.monotonic()
+        if now - self._last_progress_publish >= settings.PROGRESS_PUBLISH_INTERVAL:
+            self._last_progress_publish = now
+            self.events.publish("progress", self.aggregates.snapshot())
+
+    async def process_single_sample(self, http_session, model, data, index=None):
+        sample_start = time.perf_counter()
+        gt = data.get("a", "")
+        
+        try:
+            messages = self.requests.messages(data)
+        except (ValueError, TypeError) as e:
+            # A row the template can't format (e.g. text under {n:.2f}) fails
+            # on its own instead of taking the whole task down
+            messages = None
+            render_error = f"Template error: {e}"
+        if messages is None:
+            body = None
+        elif self.batcher is not None:
+            # Multi-prompt completions take plain text prompts, not messages
+            prompt = self.requests.text_prompt(messages)
+            body = self.requests.batch_body(prompt)
+        else:
+            body = self.requests.chat_body(messages)
+        
+        streaming = self.batcher is None and model.stream
+        stop_at_answer = streaming and model.stop_at_answer
+
+        # Only deterministic requests are cached; sampling runs must hit the model.
+        # Outputs cut short at the answer are kept apart from full ones
+        cache_key = None
+        cached = None
+        if body is not None and self.cache is not None and self.requests.deterministic:
+            cache_key = self.cache.make_key(model.api_base_url, body, "stop_at_answer" if stop_at_answer else "")
+            start = time.perf_counter()
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            _cache_time.observe(time.perf_counter() - start)
+        
+        ok = True
+        timing = {}
+        if cached is not None:
+            # Replay the original latency so latency stats stay comparable across runs
+            raw_output, latency = cached["raw_output"], cached["latency_ms"]
+            usage = Usage(cached["prompt_tokens"], cached["completion_tokens"], cached["tokens"])
+        elif body is None:
+            raw_output, usage, latency, ok = render_error, NO_USAGE, 0.0, False
+        else:
+            if self.batcher is not None:
+                raw_output, usage, latency, ok = await self.batcher.add(prompt)
+            elif streaming:
+                request = functools.partial(self._request_stream, timing=timing, stop_at_answer=stop_at_answer)
+                raw_output, usage, latency, ok = await self._request_with_retries(
+                    http_session, model, self.requests.stream_body(body), request
+                )
+            else:
+                raw_output, usage, latency, ok = await self._request_with_retries(http_session, model, body)
+            if ok and cache_key is not None:
+                await asyncio.to_thread(
+                    self.cache.put, cache_key, raw_output, usage.prompt, usage.completion, usage.total, latency
+                )
+        # Token stats count completion tokens, which every response mode reports consistently
+        tokens = usage.completion if usage.completion is not None else usage.total
+        
+        # Extraction & Scoring
+        start = time.perf_counter()
+        extracted, is_correct, instruction_followed = score(raw_output, gt)
+        _score_time.observe(time.perf_counter() - start)
+        
+        # Rows without a line index can't reach DatasetSample and keep their own text
+        inline = index is None
+        row = {
+            "task_id": self.task_id,
+            "sample_index": index,
+            "question": sample_text(data, "q") if inline else None,
+            "ground_truth": sample_text(data, "a") if inline else None,
+            "raw_output": raw_output,
+            "extracted_answer": extracted,
+            "is_correct": is_correct,
+            "instruction_followed": instruction_followed,
+            "latency_ms": latency,
+            "tokens_used": usage.total,
+            "prompt_tokens": usage.prompt,
+            "completion_tokens": usage.completion,
+            "ttft_ms": timing.get("ttft_ms"),
+            "inter_token_ms": timing.get("inter_token_ms"),
+            "tokens_per_sec": timing.get("tokens_per_sec"),
+            "stopped_early": timing.get("stopped_early", False),
+        }
+        start = time.perf_counter()
+        await self.sink.add(row)
+        _sink_time.observe(time.perf_counter() - start)
+        self.events.publish("result", {**row, "question": sample_text(data, "q"), "ground_truth": sample_text(data, "a")})
+        
+        result = {
+            "is_correct": is_correct,
+            "instruction_followed": instruction_followed,
+            "latency_ms": latency,
+            "tokens_used": tokens,
+            "ttft_ms": row["ttft_ms"],
+            "cached": cached is not None,
+            "cache_miss": cache_key is not None and cached is None,
+            "error": None if ok else error_class(raw_output),
+            "groups": sample_groups(data, settings.ANALYTICS_GROUP_FIELDS),
+        }
+        SAMPLES.inc(model.name)
+        _sample_time.observe(time.perf_counter() - sample_start)
+        return result
+
+    async def _request_with_retries(self, http_session, model, body, request=None):
+        """Returns ``(raw_output, usage, latency_ms, ok)`` for the last attempt; ``usage`` is a Usage tuple.
+
+        Overload responses (429/5xx) and transport errors are retried with
+        jittered backoff and fed to the model's limiter; only the final
+        attempt's error is stored as the sample's output. Other statuses,
+        including INVALID_RESPONSE, fail at once without backing off.
+        """
+        request = request or self._request_completion
+        limiter = self.limiter
+        for attempt in range(settings.MAX_RETRIES + 1):
+            wait_start = time.perf_counter()
+            async with limiter:
+                start = time.perf_counter()
+                raw_output, usage, status, retry_after = await request(http_session, model, body)
+                elapsed = time.perf_counter() - start
+            _limiter_wait.observe(start - wait_start)
+            _request_time.observe(elapsed)
+            REQUESTS.inc(model.name)
+            latency = elapsed * 1000
+            if status == 200:
+                limiter.on_success(latency)
+                return raw_output, usage, latency, True
+            REQUEST_ERRORS.inc(model.name, str(status) if status is not None else "exception")
+            if status is not None and status not in RETRYABLE_STATUSES:
+                return raw_output, usage, latency, False
+            limiter.on_overload(retry_after)
+            if attempt < settings.MAX_RETRIES:
+                self.retries += 1
+                delay = retry_delay(attempt, retry_after)
+                await asyncio.sleep(delay)
+                _backoff_time.observe(delay)
+        return raw_output, usage, latency, False
+
+    @staticmethod
+    def _decode(payload: bytes):
+        start = time.perf_counter()
+        decoded = json.loads(payload)
+        _decode_time.observe(time.perf_counter() - start)
+        return decoded
+
+    async def _request_completion(self, http_session, model, body):
+        """Returns ``(raw_output, usage, status, retry_after)``; errors are reported in raw_output."""
+        try:
+            async with http_session.post(f"{model.api_base_url}/chat/completions", data=body, headers=self._headers) as resp:
+                if resp.status == 200:
+                    resp_json = self._decode(await resp.read())
+                    raw_output = resp_json['choices'][0]['message']['content']
+                    return raw_output, parse_usage(resp_json.get('usage') or {}), resp.status, None
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                return f"Error: {resp.status} - {await resp.text()}", NO_USAGE, resp.status, retry_after
+        except Exception as e:
+            return f"Exception: {str(e)}", NO_USAGE, None, None
+
+    async def _request_stream(self, http_session, model, body, timing, stop_at_answer=False):
+        """Streaming variant of _request_completion.
 
-    def _check_correctness(self, extracted, ground_truth):
-        if not extracted or not ground_truth:
-            return False
-        # Simple containment or exact match (normalized)
-        return ground_truth.strip().lower() in extracted.lower()
+        Fills ``timing`` with time to first token, mean inter-token gap and
+        decode rate for the attempt. With ``stop_at_answer`` the stream is
+        closed as soon as the "answer: ..." line is complete, since nothing
+        after it can change the extracted answer.
+        """
+        timing.clear()
+        try:
+            start = time.perf_counter()
+            async with http_session.post(f"{model.api_base_url}/chat/completions", data=body, headers=self._headers) as resp:
+                if resp.status != 200:
+                    retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                    return f"Error: {resp.status} - {await resp.text()}", NO_USAGE, resp.status, retry_after
+                parts = []
+                chunks = 0
+                usage = None
+                first = last = None
+                decode_s = 0.0
+                async for line in resp.content:
+                    line = line.strip()
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    decode_start = time.perf_counter()
+                    event = json.loads(data)
+                    decode_s += time.perf_counter() - decode_start
+                    if event.get("usage"):
+                        usage = parse_usage(event["usage"])
+                    delta = event["choices"][0].get("delta", {}).get("content") if event.get("choices") else None
+                    if not delta:
+                        continue
+                    last = time.perf_counter()
+                    first = first or last
+                    chunks += 1
+                    parts.append(delta)
+                    if stop_at_answer and "\n" in delta and answer_complete("".join(parts)):
+                        timing["stopped_early"] = True
+                        break
+            _decode_time.observe(decode_s)
+            if first is not None:
+                timing["ttft_ms"] = (first - start) * 1000
+                if chunks > 1:
+                    timing["inter_token_ms"] = (last - first) * 1000 / (chunks - 1)
+                    timing["tokens_per_sec"] = (chunks - 1) / (last - first) if last > first else None
+            # Servers send usage last, so a stream cut short only has its
+            # completion chunk count (one token per chunk)
+            return "".join(parts), usage or Usage(None, chunks, chunks), resp.status, None
+        except Exception as e:
+            return f"Exception: {str(e)}", NO_USAGE, None, None
 
+    async def _complete_batch(self, http_session, model, prompts):
+        """Submit prompts as one multi-prompt completion; one result tuple per prompt.
+
+        The batch is retried as a unit and shares one limiter slot. Usage is
+        only reported per request, so token counts are split evenly over the batch.
+        """
+        request = functools.partial(self._request_batch, n_prompts=len(prompts))
+        outputs, usage, latency, ok = await self._request_with_retries(
+            http_session, model, self.requests.batch_body(prompts), request
+        )
+        if not ok:
+            return [(outputs, NO_USAGE, latency, False)] * len(prompts)
+        return [
+            (text, share, latency, True)
+            for text, share in zip(outputs, split_usage(usage, len(prompts)))
+        ]
+
+    async def _request_batch(self, http_session, model, body, n_prompts):
+        """Like _request_completion, against /completions; raw_output is a list of texts on success."""
+        try:
+            async with http_session.post(f"{model.api_base_url}/completions", data=body, headers=self._headers) as resp:
+                if resp.status == 200:
+                    resp_json = self._decode(await resp.read())
+                    choices = sorted(resp_json['choices'], key=lambda c: c.get('index', 0))
+                    if len(choices) != n_prompts:
+                        # The server answered; asking again won't change the shape
+                        return f"Invalid response: {len(choices)} choices for {n_prompts} prompts", NO_USAGE, INVALID_RESPONSE, None
+                    return [c['text'] for c in choices], parse_usage(resp_json.get('usage') or {}), resp.status, None
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                return f"Error: {resp.status} - {await resp.text()}", NO_USAGE, resp.status, retry_after
+        except Exception as e:
+            return f"Exception: {str(e)}", NO_USAGE, None, None
@@ -0,0 +1,64 @@
+import asyncio
+from app.core.dataset import iter_dataset
+from app.core.evaluator import AsyncEvaluator
+
+# Rows buffered per model ahead of its pipeline
+FEED_DEPTH = 256
+
+class FanOutEvaluator:
+    """Evaluates one dataset against several tasks (one per model) in a single pass.
+
+    The file is read and parsed once; every row is handed to each task's
+    pipeline through a bounded feed, so the slowest model sets the read pace
+    and memory stays at ``FEED_DEPTH`` rows per model. Each task keeps its own
+    limiter, result sink and aggregates.
+    """
+
+    def __init__(self, task_ids, resume: bool = False):
+        self.evaluators = [
+            AsyncEvaluator(task_id, resume=resume, feed=asyncio.Queue(maxsize=FEED_DEPTH))
+            for task_id in task_ids
+        ]
+        self._finished = set()
+
+    async def run(self, dataset):
+        runs = []
+        for evaluator in self.evaluators:
+            run = asyncio.create_task(evaluator.run())
+            run.add_done_callback(lambda _, feed=evaluator.feed: self._finish(feed))
+            runs.append(run)
+        reader = asyncio.create_task(self._read(dataset))
+        try:
+            # One pipeline failing must not cut the others off from the reader
+            results = await asyncio.gather(reader, *runs, return_exceptions=True)
+        finally:
+            reader.cancel()
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Comparison run error: {result}")
+
+    async def _read(self, dataset):
+        feeds = [e.feed for e in self.evaluators]
+        try:
+            for item in iter_dataset(dataset):
+                for feed in feeds:
+                    if feed not in self._finished:
+                        await feed.put(item)
+        except Exception as e:
+            # Hand the error to every pipeline in place of the end marker, so
+            # each task fails (and is marked FAILED) instead of waiting forever
+            end = e
+        else:
+            end = None
+        for feed in feeds:
+            if feed not in self._finished:
+                await feed.put(end)
+        if end is not None:
+            raise end
+
+    def _finish(self, feed):
+        # A pipeline that stopped early (failure) must not stall the reader:
+        # stop feeding it and free any slot a pending put() is waiting on
+        self._finished.add(feed)
+        while not feed.empty():
+            feed.get_nowait()
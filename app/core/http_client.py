@@ -0,0 +1,117 @@
+import aiohttp
+from urllib.parse import urlsplit
+from app.config import get_settings
+
+settings = get_settings()
+
+class ClientRegistry:
+    """Process-wide aiohttp sessions, one per API endpoint (scheme://host:port).
+
+    Tasks that target the same endpoint share one connection pool, so
+    keep-alive connections and TLS sessions are reused across runs. The pool
+    is sized to the sum of the limits of the models currently using the
+    endpoint; when that grows, a bigger session replaces the old one, which
+    is closed once the last task holding it releases it. Sessions are created
+    lazily and closed by the app's lifespan.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._retired = []
+        # endpoint -> {model_id: [pool_size, tasks using it]}
+        self._demand = {}
+        # session -> tasks holding it
+        self._users = {}
+
+    @staticmethod
+    def endpoint_key(api_base_url: str) -> str:
+        parts = urlsplit(api_base_url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        return f"{parts.scheme}://{parts.hostname}:{port}"
+
+    async def acquire(self, api_base_url: str, model_id: int, pool_size: int) -> aiohttp.ClientSession:
+        """Session for a task of ``model_id``, which may keep up to ``pool_size`` requests in flight.
+
+        Every acquire must be paired with a release() once the task is done.
+        """
+        key = self.endpoint_key(api_base_url)
+        models = self._demand.setdefault(key, {})
+        entry = models.setdefault(model_id, [pool_size, 0])
+        entry[0] = max(entry[0], pool_size)
+        entry[1] += 1
+        needed = sum(size for size, _ in models.values())
+
+        session = self._sessions.get(key)
+        if session is None or session.closed or session.connector.limit < needed:
+            if session is not None and not session.closed:
+                # Demand grew: hand out a bigger pool and let tasks still
+                # holding the old one finish with it
+                self._retired.append(session)
+            session = self._create(needed)
+            self._sessions[key] = session
+            await self._close_unused()
+        self._users[session] = self._users.get(session, 0) + 1
+        return session
+
+    async def release(self, api_base_url: str, model_id: int, session: aiohttp.ClientSession):
+        key = self.endpoint_key(api_base_url)
+        models = self._demand.get(key, {})
+        entry = models.get(model_id)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del models[model_id]
+        users = self._users.get(session, 0) - 1
+        if users > 0:
+            self._users[session] = users
+        else:
+            self._users.pop(session, None)
+        await self._close_unused()
+
+    async def _close_unused(self):
+        for session in [s for s in self._retired if s not in self._users]:
+            self._retired.remove(session)
+            if not session.closed:
+                await session.close()
+
+    def _create(self, pool_size: int) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=pool_size,
+            limit_per_host=pool_size,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.HTTP_TOTAL_TIMEOUT,
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            sock_read=settings.HTTP_READ_TIMEOUT,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        for session in (*self._sessions.values(), *self._retired):
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+        self._retired.clear()
+        self._demand.clear()
+        self._users.clear()
+
+    def stats(self) -> dict:
+        # aiohttp has no public pool introspection; these attributes are stable across 3.x
+        result = {}
+        for key, session in self._sessions.items():
+            connector = session.connector
+            if connector is None:
+                continue
+            in_use = len(getattr(connector, "_acquired", ()))
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            result[key] = {
+                "limit": connector.limit,
+                "in_use": in_use,
+                "idle": idle,
+                "utilization": in_use / connector.limit if connector.limit else 0.0,
+            }
+        return result
+
+http_clients = ClientRegistry()
@@ -0,0 +1,153 @@
+"""In-process metrics rendered in the Prometheus text format (GET /metrics).
+
+Counters and histograms are plain numbers updated from the event loop, so
+an observation is a bisect and a few additions. Hot paths bind the labelled
+child once (``STAGE_SECONDS.labels("score")``) rather than per call. Gauges
+describing current state (in-flight requests, queued samples, pool usage)
+are computed by a function when scraped, so they cost nothing in between.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+
+# Seconds, from a fast regex score up to a slow completion
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+REGISTRY = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    return repr(float(value)) if value == value else "NaN"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        super().__init__(name, help, labels)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self):
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; cumulated when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._children = {}
+
+    def labels(self, *values) -> _HistogramChild:
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float, *labels):
+        self.labels(*labels).observe(value)
+
+    def _samples(self):
+        for labels, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), child.counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, [('le', le)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(child.sum)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {child.count}"
+
+class GaugeFunc(_Metric):
+    """Gauge whose values ``fn()`` returns at scrape time as ``{label_values: value}``."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn, labels=()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def _samples(self):
+        for labels, value in self.fn().items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            # One broken gauge shouldn't take the whole scrape down
+            lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+# --- Evaluator hot path ---
+
+STAGE_SECONDS = Histogram(
+    "eval_stage_seconds",
+    "Time per sample or request in each evaluator stage "
+    "(limiter_wait, request, decode, retry_backoff, cache_lookup, score, sink, sample)",
+    ["stage"],
+)
+REQUESTS = Counter("eval_requests_total", "Completion requests sent, by model", ["model"])
+REQUEST_ERRORS = Counter(
+    "eval_request_errors_total", "Failed completion requests by model and HTTP status (or 'exception')",
+    ["model", "status"],
+)
+SAMPLES = Counter("eval_samples_total", "Samples scored, by model", ["model"])
+DB_FLUSH_SECONDS = Histogram("eval_db_flush_seconds", "Duration of result sink bulk inserts")
+DB_ROWS = Counter("eval_db_rows_total", "Result rows written by the result sink")
+
+# --- Event loop ---
+
+LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping monitor task",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+async def monitor_event_loop(interval: float):
+    """Sleep ``interval`` seconds at a time and record how much longer each sleep took."""
+    lag = LOOP_LAG_SECONDS.labels()
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag.observe(max(0.0, time.perf_counter() - start - interval))
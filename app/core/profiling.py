@@ -0,0 +1,72 @@
+"""On-demand profiles of this process while a task runs (POST /tasks/{id}/profile).
+
+cProfile traces every call on the event loop thread, so the profile covers
+everything running here (not only the task) and slows it down while
+active. py-spy samples the whole process from outside at little cost, but
+has to be installed and allowed to attach to it.
+"""
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import shutil
+import time
+from app.config import get_settings
+
+settings = get_settings()
+
+PROFILE_TOOLS = ("cprofile", "py-spy")
+
+class ProfileError(Exception):
+    pass
+
+# cProfile can't nest, and two py-spy captures would only measure each other
+_capturing = asyncio.Lock()
+
+def _profile_path(task_id: int, suffix: str) -> str:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    return os.path.join(settings.PROFILE_DIR, f"task-{task_id}-{time.strftime('%Y%m%d-%H%M%S')}.{suffix}")
+
+async def profile_task(task_id: int, seconds: float, tool: str, is_running) -> dict:
+    """Capture a profile for ``seconds`` (cProfile stops early once ``is_running()`` is false)."""
+    if _capturing.locked():
+        raise ProfileError("Another profile is being captured")
+    async with _capturing:
+        if tool == "py-spy":
+            return await _py_spy(task_id, seconds)
+        return await _cprofile(task_id, seconds, is_running)
+
+async def _cprofile(task_id, seconds, is_running):
+    profiler = cProfile.Profile()
+    start = time.monotonic()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Another profiler or debugger already owns the thread
+        raise ProfileError(str(e))
+    try:
+        while is_running() and (remaining := seconds - (time.monotonic() - start)) > 0:
+            await asyncio.sleep(min(0.5, remaining))
+    finally:
+        profiler.disable()
+    path = _profile_path(task_id, "prof")
+    profiler.dump_stats(path)
+    top = io.StringIO()
+    pstats.Stats(profiler, stream=top).sort_stats("cumulative").print_stats(25)
+    return {"tool": "cprofile", "path": path, "seconds": time.monotonic() - start, "top": top.getvalue()}
+
+async def _py_spy(task_id, seconds):
+    executable = shutil.which("py-spy")
+    if executable is None:
+        raise ProfileError("py-spy is not installed")
+    path = _profile_path(task_id, "speedscope.json")
+    proc = await asyncio.create_subprocess_exec(
+        executable, "record", "--pid", str(os.getpid()), "--duration", str(max(1, round(seconds))),
+        "--format", "speedscope", "--output", path, "--nonblocking",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise ProfileError(f"py-spy failed: {stderr.decode('utf-8', 'replace').strip()}")
+    return {"tool": "py-spy", "path": path, "seconds": seconds}
@@ -0,0 +1,153 @@
+"""Per-task prompt templates and pre-serialized request bodies.
+
+The system prompt and user message are ``str.format`` templates over dataset
+row fields, e.g. ``"Question: {q}"`` (literal braces are written ``{{``/``}}``).
+A template is parsed once per run into literal and field parts. The JSON
+request body is serialized once too, around placeholders for the templated
+messages, so building a sample's request only splices ``json.dumps(message)``
+between constant byte strings.
+"""
+import json
+import string
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant. Please format your final answer starting with 'answer: '."
+DEFAULT_USER_TEMPLATE = "{q}"
+DEFAULT_GENERATION_PARAMS = {"temperature": 0.0, "max_tokens": 1024}
+
+# Keys the evaluator sets itself
+RESERVED_PARAMS = {"model", "messages", "prompt", "stream", "stream_options"}
+
+_PLACEHOLDER = "\x00{}\x00"
+_CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+
+class PromptTemplate:
+    """A ``str.format`` template compiled once; missing fields render as empty."""
+
+    def __init__(self, template: str):
+        self.template = template
+        self.fields = []
+        # Alternating literal strings and (field, conversion, spec) tuples
+        self._parts = []
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError as e:
+            raise ValueError(f"Invalid template {template!r}: {e}")
+        for literal, field, spec, conversion in parsed:
+            if literal:
+                self._parts.append(literal)
+            if field is None:
+                continue
+            if not field or not field.isidentifier():
+                raise ValueError(f"Template fields must be row keys like {{q}}, got {{{field}}}")
+            self.fields.append(field)
+            self._parts.append((field, _CONVERSIONS.get(conversion), spec))
+
+    def render(self, row: dict) -> str:
+        out = []
+        for part in self._parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            field, conversion, spec = part
+            if field not in row:
+                # Rendered empty without the spec, which an empty string can't take
+                continue
+            value = row[field]
+            if conversion is not None:
+                value = conversion(value)
+            out.append(format(value, spec) if spec else str(value))
+        return "".join(out)
+
+class _SplicedBody:
+    """JSON body serialized once, with values spliced in per request at ``key_paths``."""
+
+    def __init__(self, body: dict, key_paths):
+        placeholders = []
+        for i, key_path in enumerate(key_paths):
+            target = body
+            for key in key_path[:-1]:
+                target = target[key]
+            target[key_path[-1]] = _PLACEHOLDER.format(i)
+            placeholders.append(json.dumps(_PLACEHOLDER.format(i)))
+        encoded = json.dumps(body, ensure_ascii=False)
+        # Constant pieces in body order, with the value index that follows each one
+        self._order = sorted(range(len(placeholders)), key=lambda i: encoded.index(placeholders[i]))
+        self._pieces = []
+        for i in self._order:
+            piece, encoded = encoded.split(placeholders[i], 1)
+            self._pieces.append(piece.encode("utf-8"))
+        self._tail = encoded.encode("utf-8")
+
+    def render(self, *values) -> bytes:
+        out = []
+        for piece, i in zip(self._pieces, self._order):
+            out.append(piece)
+            out.append(json.dumps(values[i], ensure_ascii=False).encode("utf-8"))
+        out.append(self._tail)
+        return b"".join(out)
+
+class RequestBuilder:
+    """Everything needed to turn a dataset row into request bytes, built once per run."""
+
+    def __init__(self, model_name: str, system_prompt: str = None, user_template: str = None,
+                 few_shot=None, generation_params: dict = None):
+        self.system_template = PromptTemplate(DEFAULT_SYSTEM_PROMPT if system_prompt is None else system_prompt)
+        self.user_template = PromptTemplate(user_template or DEFAULT_USER_TEMPLATE)
+        # A system prompt without fields is part of the constant body
+        self.system_prompt = None if self.system_template.fields else self.system_template.render({})
+        self.few_shot = [(ex["user"], ex["assistant"]) for ex in few_shot or []]
+        reserved = RESERVED_PARAMS & set(generation_params or {})
+        if reserved:
+            raise ValueError(f"Generation params may not set {', '.join(sorted(reserved))}")
+        self.params = {**DEFAULT_GENERATION_PARAMS, **(generation_params or {})}
+
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_template.template else []
+        for user, assistant in self.few_shot:
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": assistant})
+        messages.append({"role": "user", "content": None})
+        spliced = [("messages", len(messages) - 1, "content")]
+        if self.system_prompt is None:
+            spliced.append(("messages", 0, "content"))
+        self._chat = _SplicedBody({"model": model_name, "messages": messages, **self.params}, spliced)
+        self._batch = _SplicedBody({"model": model_name, "prompt": None, **self.params}, [("prompt",)])
+        # Text form for multi-prompt completions, which take no messages
+        self._text_shots = "".join(f"{user}\n{assistant}\n\n" for user, assistant in self.few_shot)
+
+    @classmethod
+    def from_task(cls, task, model) -> "RequestBuilder":
+        return cls(
+            model.model_name_identifier,
+            system_prompt=task.system_prompt,
+            user_template=task.user_template,
+            few_shot=json.loads(task.few_shot_json) if task.few_shot_json else None,
+            generation_params=json.loads(task.generation_params_json) if task.generation_params_json else None,
+        )
+
+    @property
+    def deterministic(self) -> bool:
+        # Only greedy decoding gives repeatable outputs worth caching
+        return self.params.get("temperature", 1.0) == 0
+
+    def messages(self, row: dict):
+        """``(user_message, system_prompt)`` for a row; the system prompt is None when constant."""
+        system = None if self.system_prompt is not None else self.system_template.render(row)
+        return self.user_template.render(row), system
+
+    def chat_body(self, messages) -> bytes:
+        user, system = messages
+        return self._chat.render(user) if system is None else self._chat.render(user, system)
+
+    @staticmethod
+    def stream_body(chat_body: bytes) -> bytes:
+        return b'{"stream": true, "stream_options": {"include_usage": true}, ' + chat_body[1:]
+
+    def text_prompt(self, messages) -> str:
+        user, system = messages
+        if system is None:
+            system = self.system_prompt
+        head = f"{system}\n\n" if system else ""
+        return f"{head}{self._text_shots}{user}\n"
+
+    def batch_body(self, prompts) -> bytes:
+        return self._batch.render(prompts)
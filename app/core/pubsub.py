@@ -0,0 +1,72 @@
+import asyncio
+import itertools
+from collections import deque
+
+class EventLog:
+    """In-process fan-out of task events to any number of subscribers.
+
+    The producer appends to a bounded ring buffer and never blocks. Every
+    subscriber reads from its own cursor (the sequence number of the next
+    event it wants), so a slow client only falls behind itself. A client
+    whose cursor has dropped out of the buffer receives a single ``gap``
+    event and continues from the oldest retained event; a reconnecting
+    client resumes by passing back the last sequence number it saw.
+    """
+
+    def __init__(self, maxlen: int = 10000):
+        self._events = deque(maxlen=maxlen)
+        self._next_seq = 0
+        self._waiter = None
+        self.closed = False
+
+    @property
+    def next_seq(self) -> int:
+        return self._next_seq
+
+    def publish(self, event: str, data):
+        self._events.append((self._next_seq, event, data))
+        self._next_seq += 1
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        self._waiter = None
+
+    def _wait(self):
+        if self._waiter is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+        return self._waiter
+
+    async def subscribe(self, cursor: int = None, keepalive: float = 15.0):
+        """Yield ``(seq, event, data)`` tuples from ``cursor`` onwards.
+
+        Yields ``(None, None, None)`` every ``keepalive`` seconds of silence so
+        callers can detect dropped connections.
+        """
+        if cursor is None or cursor > self._next_seq:
+            cursor = self._next_seq
+        while True:
+            oldest = self._events[0][0] if self._events else self._next_seq
+            if cursor < oldest:
+                yield None, "gap", {"missed": oldest - cursor}
+                cursor = oldest
+            # Slice from the right: cost is proportional to the events this
+            # subscriber hasn't seen yet, not to the buffer size
+            pending = self._next_seq - cursor
+            if pending:
+                batch = list(itertools.islice(reversed(self._events), pending))
+                for item in reversed(batch):
+                    yield item
+                cursor += pending
+                continue
+            if self.closed:
+                return
+            try:
+                await asyncio.wait_for(asyncio.shield(self._wait()), keepalive)
+            except asyncio.TimeoutError:
+                yield None, None, None
@@ -0,0 +1,118 @@
+"""Offline re-scoring: recompute correctness from stored raw_output, without API calls.
+
+Usage: python -m app.core.rescore TASK_ID [--chunk-size N] [--workers N]
+"""
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlmodel import Session, func, select, update
+from app.config import get_settings
+from app.database import engine
+from app.models import Dataset, EvaluationLog, EvaluationResult
+from app.core.dataset import DatasetReader
+from app.core.samples import samples_join
+from app.core.scoring import score_rows
+from app.core.stats import RunningStats, error_class, sample_groups
+
+settings = get_settings()
+
+def _iter_chunks(session, task_id, chunk_size):
+    # Keyset pagination on the primary key: each page is an index range scan,
+    # so cost per page stays flat no matter how deep into the task we are
+    last_id = 0
+    results = EvaluationResult.__table__
+    source, text = samples_join(results, results, task_id)
+    while True:
+        rows = session.exec(
+            select(
+                EvaluationResult.id,
+                EvaluationResult.raw_output,
+                text["ground_truth"],
+                EvaluationResult.latency_ms,
+                func.coalesce(EvaluationResult.completion_tokens, EvaluationResult.tokens_used),
+                EvaluationResult.sample_index,
+                EvaluationResult.ttft_ms,
+            )
+            .select_from(source)
+            .where(EvaluationResult.task_id == task_id, EvaluationResult.id > last_id)
+            .order_by(EvaluationResult.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+def _apply(session, stats, rows, scored, reader=None):
+    session.execute(
+        update(EvaluationResult),
+        [
+            {"id": row_id, "extracted_answer": extracted, "is_correct": is_correct,
+             "instruction_followed": instruction_followed}
+            for row_id, extracted, is_correct, instruction_followed in scored
+        ],
+    )
+    session.commit()
+    for row, (_, _, is_correct, instruction_followed) in zip(rows, scored):
+        groups = None
+        if reader is not None and row[5] is not None and row[5] < len(reader):
+            groups = sample_groups(reader.get(row[5]) or {}, settings.ANALYTICS_GROUP_FIELDS)
+        stats.add(is_correct, instruction_followed, row[3], row[4], error=error_class(row[1]), groups=groups, ttft_ms=row[6])
+
+def rescore_task(task_id: int, chunk_size: int = None, workers: int = None) -> dict:
+    """Re-run extraction and scoring for every result of a task and refresh its aggregates.
+
+    At most ``2 * workers`` chunks are in flight at once, so memory is bounded
+    by ``chunk_size`` rather than by the size of the task.
+    """
+    chunk_size = chunk_size or settings.RESCORE_CHUNK_SIZE
+    workers = workers or settings.RESCORE_WORKERS or multiprocessing.cpu_count()
+    stats = RunningStats()
+
+    with Session(engine) as session:
+        task = session.get(EvaluationLog, task_id)
+        if not task:
+            raise ValueError(f"Task {task_id} not found")
+        dataset = session.get(Dataset, task.dataset_id)
+        reader = None
+        if dataset and dataset.index_path and settings.ANALYTICS_GROUP_FIELDS:
+            reader = DatasetReader(dataset.samples_path, dataset.index_path)
+
+        # spawn: workers only need app.core.scoring, not a fork of this process's state
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            pending = deque()
+            for rows in _iter_chunks(session, task_id, chunk_size):
+                pending.append((rows, pool.submit(score_rows, [(r[0], r[1], r[2]) for r in rows])))
+                if len(pending) >= 2 * workers:
+                    done_rows, future = pending.popleft()
+                    _apply(session, stats, done_rows, future.result(), reader)
+            while pending:
+                done_rows, future = pending.popleft()
+                _apply(session, stats, done_rows, future.result(), reader)
+        if reader is not None:
+            reader.close()
+
+        # Cache hits and misses describe how the outputs were obtained, not how they score
+        stats.cache_hits = task.cache_hits
+        stats.cache_misses = task.cache_misses
+        for key, value in stats.columns().items():
+            setattr(task, key, value)
+        session.add(task)
+        session.commit()
+    snapshot = stats.snapshot()
+    snapshot.pop("cache_hits")
+    snapshot.pop("cache_misses")
+    return snapshot
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score a task from its stored raw outputs.")
+    parser.add_argument("task_id", type=int)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    print(rescore_task(args.task_id, chunk_size=args.chunk_size, workers=args.workers))
+
+if __name__ == "__main__":
+    main()
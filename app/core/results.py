@@ -0,0 +1,159 @@
+"""Filtering, projection and streaming export of per-sample results.
+
+Pages and exports walk ``(task_id, id)`` in id order, so a page is one index
+range scan from the previous page's last id however deep it is, and an export
+is a single server-side cursor read in fixed-size batches.
+"""
+import csv
+import importlib.util
+import io
+import json
+from typing import List, Optional
+from sqlalchemy import Boolean, Float, Integer, select
+from sqlmodel import Session
+from app.database import engine
+from app.models import EvaluationResult
+from app.core.samples import SAMPLE_FIELDS, samples_join
+
+RESULT_FIELDS = tuple(EvaluationResult.__table__.columns.keys())
+EXPORT_BATCH_SIZE = 5000
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+ARROW_FORMATS = ("parquet", "arrow")
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Comma-separated column names -> list; ``id`` is always included (it is the cursor)."""
+    if not fields:
+        return list(RESULT_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    if "id" not in names:
+        names.insert(0, "id")
+    return names
+
+def results_query(
+    task_id: int,
+    fields: List[str],
+    is_correct: Optional[bool] = None,
+    instruction_followed: Optional[bool] = None,
+    min_latency_ms: Optional[float] = None,
+    after: Optional[int] = None,
+):
+    table = EvaluationResult.__table__
+    if any(name in SAMPLE_FIELDS for name in fields):
+        source, sample_columns = samples_join(table, table, task_id)
+    else:
+        source, sample_columns = table, {}
+    stmt = (
+        select(*(sample_columns.get(name, table.c[name]) for name in fields))
+        .select_from(source)
+        .where(table.c.task_id == task_id)
+    )
+    if is_correct is not None:
+        stmt = stmt.where(table.c.is_correct == is_correct)
+    if instruction_followed is not None:
+        stmt = stmt.where(table.c.instruction_followed == instruction_followed)
+    if min_latency_ms is not None:
+        stmt = stmt.where(table.c.latency_ms >= min_latency_ms)
+    if after is not None:
+        stmt = stmt.where(table.c.id > after)
+    return stmt.order_by(table.c.id)
+
+def iter_batches(stmt, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield lists of rows from a server-side cursor, holding one batch in memory."""
+    with Session(engine) as session:
+        result = session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for batch in result.partitions():
+            yield batch
+
+def export_ndjson(batches, fields):
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(fields, row))) + "\n" for row in rows).encode("utf-8")
+
+def export_csv(batches, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def export_arrow(batches, fields, parquet: bool):
+    """Parquet or Arrow IPC stream, one row group / record batch per cursor batch."""
+    import pyarrow as pa
+
+    def arrow_type(column):
+        if isinstance(column.type, Boolean):
+            return pa.bool_()
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, Float):
+            return pa.float64()
+        return pa.string()
+
+    table = EvaluationResult.__table__
+    schema = pa.schema([(name, arrow_type(table.c[name])) for name in fields])
+
+    sink = _ChunkSink()
+    if parquet:
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    for rows in batches:
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+def export_results(stmt, fields, fmt: str):
+    batches = iter_batches(stmt)
+    if fmt == "ndjson":
+        return export_ndjson(batches, fields)
+    if fmt == "csv":
+        return export_csv(batches, fields)
+    return export_arrow(batches, fields, parquet=(fmt == "parquet"))
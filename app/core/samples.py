@@ -0,0 +1,66 @@
+"""Question/answer text stored once per dataset instead of with every result.
+
+``DatasetSample`` holds each line's question and ground truth keyed by
+``(dataset_id, line_index)``; results carry only ``sample_index`` and read
+the text back through a join. Samples are written the first time a dataset
+is evaluated.
+"""
+import threading
+from collections import defaultdict
+from sqlalchemy import and_, func, insert, select
+from sqlmodel import Session
+from app.database import engine
+from app.models import Dataset, DatasetSample, EvaluationLog
+from app.core.dataset import iter_dataset
+
+SAMPLE_FIELDS = ("question", "ground_truth")
+SAMPLE_INSERT_BATCH = 5000
+
+# One writer per dataset in this process; other processes are covered by INSERT IGNORE
+_locks = defaultdict(threading.Lock)
+
+def sample_text(data: dict, key: str) -> str:
+    value = data.get(key, "")
+    return value if isinstance(value, str) else ("" if value is None else str(value))
+
+def _insert_ignore():
+    # A concurrent or interrupted earlier pass may have stored some lines already
+    return insert(DatasetSample).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+
+def ensure_samples(dataset_id: int):
+    """Store every line of the dataset in DatasetSample unless that has been done already."""
+    with _locks[dataset_id], Session(engine) as session:
+        dataset = session.get(Dataset, dataset_id)
+        if dataset is None or dataset.samples_stored:
+            return
+        batch = []
+        for index, data in iter_dataset(dataset):
+            batch.append({
+                "dataset_id": dataset_id,
+                "line_index": index,
+                "question": sample_text(data, "q"),
+                "ground_truth": sample_text(data, "a"),
+            })
+            if len(batch) >= SAMPLE_INSERT_BATCH:
+                session.execute(_insert_ignore(), batch)
+                batch = []
+        if batch:
+            session.execute(_insert_ignore(), batch)
+        dataset.samples_stored = True
+        session.add(dataset)
+        session.commit()
+
+def samples_join(source, results, task_id: int):
+    """``(source joined to samples, {name: column})`` reading question/ground_truth for a task's results.
+
+    ``results`` is the EvaluationResult table or the alias of it within
+    ``source``. Text still stored on a result row (legacy rows, rows without
+    a line index) wins.
+    """
+    samples = DatasetSample.__table__.alias()
+    dataset_id = select(EvaluationLog.dataset_id).where(EvaluationLog.id == task_id).scalar_subquery()
+    joined = source.outerjoin(
+        samples, and_(samples.c.dataset_id == dataset_id, samples.c.line_index == results.c.sample_index)
+    )
+    columns = {name: func.coalesce(results.c[name], samples.c[name]).label(name) for name in SAMPLE_FIELDS}
+    return joined, columns
@@ -0,0 +1,94 @@
+import re
+from operator import itemgetter
+
+# Regex for extracting "answer: X" or "\boxed{X}"
+# Priority: 1. "answer:\s*(.*)" 2. "\\boxed\{(.*?)\}"
+ANSWER_PATTERNS = [
+    re.compile(r"answer:\s*(.+?)(?:\n|$)", re.IGNORECASE),
+    re.compile(r"\\boxed\{(.+?)\}", re.IGNORECASE)
+]
+
+INSTRUCTION_PATTERN = re.compile(r"answer:", re.IGNORECASE)
+
+# Scoring is kept free of app state so it can run in worker processes
+
+def extract_answer(text):
+    for pattern in ANSWER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).strip()
+    return text.strip() # Fallback to full text if no pattern found (or empty)
+
+def check_correctness(extracted, ground_truth):
+    if not extracted or not ground_truth:
+        return False
+    # Simple containment or exact match (normalized)
+    return ground_truth.strip().lower() in extracted.lower()
+
+def follows_instruction(text):
+    return bool(INSTRUCTION_PATTERN.search(text))
+
+def answer_complete(text):
+    """True once ``text`` holds a finished "answer: X" line.
+
+    The first such line is what extract_answer() returns however the text
+    continues, so a streamed response can be cut off at that point.
+    """
+    match = ANSWER_PATTERNS[0].search(text)
+    # A whitespace-only capture could still grow into the real answer line
+    return bool(match) and text[match.end() - 1] == "\n" and bool(match.group(1).strip())
+
+def score(raw_output, ground_truth):
+    """Returns ``(extracted_answer, is_correct, instruction_followed)``."""
+    raw_output = raw_output or ""
+    extracted = extract_answer(raw_output)
+    return extracted, check_correctness(extracted, ground_truth), follows_instruction(raw_output)
+
+# --- Batch scoring ---
+#
+# For ASCII text (the overwhelmingly common case for model output) the
+# "answer:" rule reduces to plain string operations: lower() once, then a
+# C-level str.find for the marker instead of a case-insensitive regex scan.
+# Anything the fast path can't decide exactly (non-ASCII text, an answer that
+# isn't on the marker's line, \boxed{} answers) falls back to the regex path
+# above, so results are identical to score().
+
+ANSWER_MARKER = "answer:"
+BOXED_MARKER = "\\boxed{"
+
+def _score_one(raw, gt):
+    if not raw.isascii():
+        return score(raw, gt)
+    lowered = raw.lower()
+    start = lowered.find(ANSWER_MARKER)
+    if start < 0:
+        # No marker anywhere, so only \boxed{} or the whole text can be the
+        # answer; start the regex at the first candidate instead of rescanning
+        boxed = lowered.find(BOXED_MARKER)
+        match = ANSWER_PATTERNS[1].search(raw, boxed) if boxed >= 0 else None
+        extracted = match.group(1).strip() if match else raw.strip()
+        return extracted, check_correctness(extracted, gt), False
+    start += len(ANSWER_MARKER)
+    end = raw.find("\n", start)
+    extracted = (raw[start:end] if end >= 0 else raw[start:]).strip()
+    if not extracted:
+        # Answer continues past a newline (or is empty): let the regex decide
+        extracted = extract_answer(raw)
+    if extracted and gt:
+        return extracted, gt.strip().lower() in extracted.lower(), True
+    return extracted, False, True
+
+def score_batch(raw_outputs, ground_truths):
+    """Score columns of raw outputs and ground truths.
+
+    Returns three lists (extracted answers, is_correct flags,
+    instruction_followed flags) aligned with the inputs, identical to calling
+    score() per row.
+    """
+    scored = [_score_one(raw or "", gt) for raw, gt in zip(raw_outputs, ground_truths)]
+    return [list(map(itemgetter(i), scored)) for i in range(3)]
+
+def score_rows(rows):
+    """Score ``(id, raw_output, ground_truth)`` tuples; returns ``(id, *score)`` tuples."""
+    extracted, correct, followed = score_batch([r[1] for r in rows], [r[2] for r in rows])
+    return list(zip([r[0] for r in rows], extracted, correct, followed))
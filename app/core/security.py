@@ -1,12 +1,18 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Union
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.config import get_settings
-from app.database import get_session
+from app.database import get_async_session
 from app.models import User
 
 settings = get_settings()
@@ -14,12 +20,22 @@ settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
+# bcrypt releases the GIL, so a few threads keep hashing off the event loop
+# without tying up the pool that runs sync endpoints
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -30,7 +46,54 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> User:
+class UserCache:
+    """Bounded LRU of users by username whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # Also reachable from worker threads, not just the event loop
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, username: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: User):
+        if not self.enabled:
+            return
+        # Detached copy: the request's session is gone by the time it is reused
+        cached = User(id=user.id, username=user.username, hashed_password=user.hashed_password)
+        with self._lock:
+            self._entries[user.username] = (time.monotonic() + self.ttl, cached)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: Optional[str] = None):
+        """Drop one user (after it changes) or, without a username, everyone."""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_TTL, settings.AUTH_USER_CACHE_SIZE)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -43,10 +106,18 @@ def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Dep
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
+
+    # The signature already vouches for these claims; older tokens carry no uid
+    if settings.AUTH_CLAIMS_ONLY and payload.get("uid") is not None:
+        return User(id=payload["uid"], username=username, hashed_password="")
+
+    # The session only connects if the cache misses
+    user = user_cache.get(username)
+    if user is not None:
+        return user
     statement = select(User).where(User.username == username)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     if user is None:
         raise credentials_exception
+    user_cache.put(user)
     return user
-
@@ -0,0 +1,246 @@
+"""Durable sharded task queue backed by the existing database.
+
+A task is split into TaskShard rows covering fixed ranges of dataset lines.
+Worker processes (``python -m app.worker``) lease shards with a conditional
+UPDATE, so no two workers ever hold the same shard, and keep the lease alive
+through their progress checkpoints. Shards whose lease expires (dead worker)
+become claimable again; the next owner resumes from the results already
+stored for that range.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select, update, func
+from app.config import get_settings
+from app.database import engine
+from app.models import EvaluationLog, TaskShard, ShardStatus, TaskStatus
+from app.core.evaluator import AsyncEvaluator
+from app.core.stats import RunningStats
+
+settings = get_settings()
+
+class LeaseLost(Exception):
+    """The shard's lease expired and was taken over by another worker."""
+
+def _claimable(now):
+    return or_(
+        TaskShard.status == ShardStatus.PENDING,
+        and_(TaskShard.status == ShardStatus.LEASED, TaskShard.lease_expires_at < now),
+    )
+
+def enqueue_task(session: Session, task: EvaluationLog, total_lines: int, shard_size: int = None):
+    shard_size = shard_size or settings.SHARD_SIZE
+    for start in range(0, max(total_lines, 1), shard_size):
+        session.add(TaskShard(task_id=task.id, start_line=start, end_line=min(start + shard_size, total_lines)))
+    session.commit()
+
+def task_has_shards(session: Session, task_id: int) -> bool:
+    return session.exec(select(TaskShard.id).where(TaskShard.task_id == task_id).limit(1)).first() is not None
+
+def task_has_open_shards(session: Session, task_id: int) -> bool:
+    """Whether any shard of the task is still waiting for or held by a worker."""
+    return session.exec(
+        select(TaskShard.id)
+        .where(TaskShard.task_id == task_id, TaskShard.status.in_([ShardStatus.PENDING, ShardStatus.LEASED]))
+        .limit(1)
+    ).first() is not None
+
+def requeue_failed_shards(session: Session, task_id: int):
+    session.exec(
+        update(TaskShard)
+        .where(TaskShard.task_id == task_id, TaskShard.status == ShardStatus.FAILED)
+        .values(status=ShardStatus.PENDING, lease_owner=None, lease_expires_at=None, attempts=0)
+    )
+    session.exec(update(EvaluationLog).where(EvaluationLog.id == task_id).values(status=TaskStatus.RUNNING))
+    session.commit()
+
+def claim_shard(worker_id: str):
+    """Lease the oldest claimable shard to ``worker_id``, or return None."""
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        # SKIP LOCKED lets concurrent workers pick different candidates on
+        # MySQL; the conditional UPDATE is what actually guarantees exclusivity
+        candidates = session.exec(
+            select(TaskShard.id, TaskShard.status)
+            .where(_claimable(now))
+            .order_by(TaskShard.id)
+            .limit(settings.SHARD_CLAIM_BATCH)
+            .with_for_update(skip_locked=True)
+        ).all()
+        for shard_id, status in candidates:
+            values = {
+                "status": ShardStatus.LEASED,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=settings.SHARD_LEASE_SECONDS),
+            }
+            if status == ShardStatus.LEASED:
+                # The lease ran out without a release: its worker died mid-shard
+                values["attempts"] = TaskShard.attempts + 1
+            result = session.exec(
+                update(TaskShard)
+                .where(TaskShard.id == shard_id, TaskShard.status == status, _claimable(now))
+                .values(**values)
+            )
+            if result.rowcount == 1:
+                session.commit()
+                shard = session.get(TaskShard, shard_id)
+                session.expunge(shard)
+                return shard
+        session.commit()
+    return None
+
+def _owned(shard_id, worker_id):
+    return and_(
+        TaskShard.id == shard_id,
+        TaskShard.lease_owner == worker_id,
+        TaskShard.status == ShardStatus.LEASED,
+    )
+
+def _merged_stats(session: Session, task_id: int) -> RunningStats:
+    merged = RunningStats()
+    for stats_json in session.exec(
+        select(TaskShard.stats_json).where(TaskShard.task_id == task_id, TaskShard.stats_json.is_not(None))
+    ):
+        merged.merge(RunningStats.from_dict(json.loads(stats_json)))
+    return merged
+
+def _update_task(session: Session, task_id: int, **values):
+    session.exec(update(EvaluationLog).where(EvaluationLog.id == task_id).values(**values))
+    session.commit()
+
+def _shard_values(stats: dict) -> dict:
+    return {
+        "stats_json": json.dumps(stats),
+        "processed_samples": stats["processed"],
+        "correct_samples": stats["correct"],
+    }
+
+def heartbeat_shard(shard_id: int, worker_id: str, task_id: int, stats: Optional[dict]):
+    """Extend the lease and record ``stats``; with None (worker still setting up) only extend the lease."""
+    with Session(engine) as session:
+        result = session.exec(
+            update(TaskShard)
+            .where(_owned(shard_id, worker_id))
+            .values(
+                lease_expires_at=datetime.utcnow() + timedelta(seconds=settings.SHARD_LEASE_SECONDS),
+                **(_shard_values(stats) if stats is not None else {}),
+            )
+        )
+        if result.rowcount != 1:
+            session.rollback()
+            raise LeaseLost(f"Lease on shard {shard_id} lost")
+        session.commit()
+        # Live progress from the shards' counters; deserializing and merging
+        # every shard's full stats is left to the finalizing worker
+        processed, correct = session.exec(
+            select(func.sum(TaskShard.processed_samples), func.sum(TaskShard.correct_samples))
+            .where(TaskShard.task_id == task_id)
+        ).one()
+        processed = processed or 0
+        _update_task(
+            session, task_id,
+            processed_samples=processed, accuracy=(correct or 0) / processed if processed else 0,
+        )
+
+def complete_shard(shard_id: int, worker_id: str, task_id: int, stats: dict):
+    with Session(engine) as session:
+        result = session.exec(
+            update(TaskShard)
+            .where(_owned(shard_id, worker_id))
+            .values(status=ShardStatus.DONE, lease_expires_at=None, **_shard_values(stats))
+        )
+        session.commit()
+        if result.rowcount != 1:
+            raise LeaseLost(f"Lease on shard {shard_id} lost")
+        # Counted after our own commit, so whichever worker finishes last sees
+        # zero and finalizes; finalizing twice is harmless
+        remaining = session.exec(
+            select(func.count(TaskShard.id)).where(TaskShard.task_id == task_id, TaskShard.status != ShardStatus.DONE)
+        ).one()
+        if remaining == 0:
+            _update_task(
+                session, task_id,
+                status=TaskStatus.COMPLETED, end_time=datetime.utcnow(),
+                **_merged_stats(session, task_id).columns(),
+            )
+
+def release_shard(shard_id: int, worker_id: str, stats: dict = None, failed: bool = False):
+    """Give a shard back to the queue (on error or shutdown) for another attempt.
+
+    Only ``failed`` releases count towards SHARD_MAX_ATTEMPTS; a shutdown doesn't.
+    """
+    values = {"status": ShardStatus.PENDING, "lease_owner": None, "lease_expires_at": None}
+    if stats is not None:
+        values.update(_shard_values(stats))
+    if failed:
+        values["attempts"] = TaskShard.attempts + 1
+    with Session(engine) as session:
+        session.exec(update(TaskShard).where(_owned(shard_id, worker_id)).values(**values))
+        session.commit()
+
+def fail_shard(shard_id: int, task_id: int):
+    with Session(engine) as session:
+        session.exec(
+            update(TaskShard)
+            .where(TaskShard.id == shard_id)
+            .values(status=ShardStatus.FAILED, lease_owner=None, lease_expires_at=None)
+        )
+        session.commit()
+        _update_task(session, task_id, status=TaskStatus.FAILED, end_time=datetime.utcnow())
+
+class ShardEvaluator(AsyncEvaluator):
+    """Evaluates one leased shard; progress checkpoints double as lease heartbeats."""
+
+    checkpoint_when_idle = True
+
+    def __init__(self, shard: TaskShard, worker_id: str):
+        super().__init__(shard.task_id, resume=True, line_range=(shard.start_line, shard.end_line))
+        self.shard_id = shard.id
+        self.worker_id = worker_id
+        self.lease_lost = False
+        self._run_task = None
+        self._loop = None
+
+    async def run(self):
+        self._run_task = asyncio.current_task()
+        self._loop = asyncio.get_running_loop()
+        try:
+            await super().run()
+        except asyncio.CancelledError:
+            # Shutdown: hand the shard back right away instead of waiting for the lease to expire
+            if not self.lease_lost:
+                await asyncio.to_thread(release_shard, self.shard_id, self.worker_id, self.aggregates.to_dict())
+            raise
+
+    async def _on_start(self, task, dataset):
+        if task.status != TaskStatus.RUNNING:
+            task.status = TaskStatus.RUNNING
+            task.start_time = task.start_time or datetime.utcnow()
+            task.total_samples = dataset.total_count
+            self.session_db.add(task)
+            await self.session_db.commit()
+
+    async def _on_complete(self, task):
+        try:
+            await asyncio.to_thread(complete_shard, self.shard_id, self.worker_id, self.task_id, self.aggregates.to_dict())
+        except LeaseLost as e:
+            print(f"Shard {self.shard_id}: {e}")
+
+    async def _on_failure(self, task):
+        await asyncio.to_thread(release_shard, self.shard_id, self.worker_id, self.aggregates.to_dict(), True)
+
+    def _checkpoint_values(self):
+        return self.aggregates.to_dict()
+
+    def _write_checkpoint(self, values):
+        try:
+            heartbeat_shard(self.shard_id, self.worker_id, self.task_id, values)
+        except LeaseLost:
+            # Another worker owns this range now; stop rather than duplicate its
+            # work, and drop buffered rows it will write itself
+            self.lease_lost = True
+            self._loop.call_soon_threadsafe(self.sink.discard)
+            self._loop.call_soon_threadsafe(self._run_task.cancel)
+            raise
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from sqlalchemy import insert
+from sqlmodel import Session
+from app.database import engine
+from app.models import EvaluationResult
+from app.core.metrics import DB_FLUSH_SECONDS, DB_ROWS
+
+class ResultSink:
+    """Buffers EvaluationResult rows and writes them as bulk INSERTs off the event loop.
+
+    Rows are flushed when the buffer reaches ``batch_size`` or every
+    ``flush_interval`` seconds, whichever comes first. Writes run in a worker
+    thread so in-flight HTTP requests are never stalled by a DB round-trip.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._flush_lock = asyncio.Lock()
+        self._timer = None
+        self._discarded = False
+
+        # Metrics
+        self.rows_written = 0
+        self.flush_count = 0
+        self.in_flight_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        # Flush on success and on failure so no scored rows are lost
+        await self.close()
+
+    def start(self):
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._periodic_flush())
+
+    async def add(self, row: dict):
+        if self._discarded:
+            return
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            # Awaiting here applies backpressure when the DB falls behind
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._buffer or self._discarded:
+                return
+            rows, self._buffer = self._buffer, []
+            self.in_flight_rows = len(rows)
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception:
+                # Put the rows back so a later flush can retry them
+                self._buffer[:0] = rows
+                raise
+            finally:
+                self.in_flight_rows = 0
+            elapsed = (time.perf_counter() - start) * 1000
+            DB_FLUSH_SECONDS.observe(elapsed / 1000)
+            DB_ROWS.inc(amount=len(rows))
+            self.rows_written += len(rows)
+            self.flush_count += 1
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self.total_flush_ms += elapsed
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        await self.flush()
+
+    def discard(self):
+        """Drop buffered rows and ignore any added later (a write already running still lands)."""
+        self._discarded = True
+        self._buffer.clear()
+
+    async def _periodic_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Rows stay buffered; the next size/time trigger retries them
+                print(f"Result flush failed: {e}")
+
+    def _write(self, rows):
+        with Session(engine) as session:
+            session.execute(insert(EvaluationResult), rows)
+            session.commit()
+
+    @property
+    def backlog(self) -> int:
+        return len(self._buffer) + self.in_flight_rows
+
+    def stats(self) -> dict:
+        return {
+            "rows_written": self.rows_written,
+            "backlog": self.backlog,
+            "flush_count": self.flush_count,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flush_count if self.flush_count else 0.0,
+        }
@@ -0,0 +1,266 @@
+import json
+import math
+
+# Per-field cap on distinct values tracked in accuracy breakdowns
+MAX_GROUPS_PER_FIELD = 100
+OTHER_GROUP = "(other)"
+
+# Stored outputs that start with these are failures, not model text
+ERROR_PREFIXES = ("Error: ", "Exception: ", "Invalid response: ")
+
+def error_class(raw_output):
+    """Failure class of a stored output (see AsyncEvaluator._request_completion), or None."""
+    if not raw_output:
+        return None
+    if isinstance(raw_output, bytes):
+        # Head read straight from the column; compressed outputs are never failures
+        raw_output = raw_output.decode("utf-8", "replace")
+    if raw_output.startswith("Error: "):
+        return "http_" + raw_output[7:].split(" ", 1)[0]
+    if raw_output.startswith("Exception: "):
+        return "exception"
+    if raw_output.startswith("Template error: "):
+        return "template"
+    if raw_output.startswith("Invalid response: "):
+        return "invalid_response"
+    return None
+
+def sample_groups(data: dict, fields) -> dict:
+    """``{field: [values]}`` for the breakdown fields present on a dataset row."""
+    groups = {}
+    for field in fields:
+        value = data.get(field)
+        values = value if isinstance(value, list) else [value]
+        values = [str(v) for v in values if isinstance(v, (str, int, float, bool))]
+        if values:
+            groups[field] = values
+    return groups
+
+class LogHistogram:
+    """Mergeable streaming histogram with bounded relative error.
+
+    Values are counted in logarithmically sized buckets (as in DDSketch), so
+    any quantile is within ``relative_accuracy`` of the true value while
+    memory stays proportional to the dynamic range, not the sample count.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other: "LogHistogram"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge histograms with different accuracy")
+        for key, n in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Bucket midpoint (in relative terms) keeps the error symmetric
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def bins(self) -> list:
+        """``[lower, upper, count]`` per non-empty bucket, in ascending order."""
+        out = [[0.0, 0.0, self.zero_count]] if self.zero_count else []
+        for key in sorted(self.buckets):
+            out.append([self._gamma ** (key - 1), self._gamma ** key, self.buckets[key]])
+        return out
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            **{f"p{int(q * 100)}": self.quantile(q) for q in (0.5, 0.9, 0.95, 0.99)},
+            "bins": self.bins(),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "buckets": {str(k): n for k, n in self.buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogHistogram":
+        hist = cls(data["relative_accuracy"])
+        hist.buckets = {int(k): n for k, n in data["buckets"].items()}
+        hist.zero_count = data["zero_count"]
+        hist.count = data["count"]
+        hist.min = data["min"]
+        hist.max = data["max"]
+        return hist
+
+class RunningStats:
+    """O(1) running aggregates for a task, checkpointed to EvaluationLog."""
+
+    def __init__(self):
+        self.processed = 0
+        self.correct = 0
+        self.instruction_followed = 0
+        self.total_latency = 0.0
+        self.total_tokens = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latency = LogHistogram()
+        self.tokens = LogHistogram()
+        self.ttft = LogHistogram()
+        self.errors = {}
+        # {field: {value: [samples, correct]}}
+        self.groups = {}
+
+    def add(
+        self, is_correct: bool, instruction_followed: bool, latency_ms: float, tokens: int,
+        cached: bool = False, error: str = None, groups: dict = None, ttft_ms: float = None,
+        cache_miss: bool = False,
+    ):
+        self.processed += 1
+        self.cache_hits += 1 if cached else 0
+        self.cache_misses += 1 if cache_miss else 0
+        self.correct += 1 if is_correct else 0
+        self.instruction_followed += 1 if instruction_followed else 0
+        self.total_latency += latency_ms
+        self.total_tokens += tokens
+        self.latency.add(latency_ms)
+        self.tokens.add(tokens)
+        if ttft_ms is not None:
+            self.ttft.add(ttft_ms)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        if groups:
+            for field, values in groups.items():
+                for value in values:
+                    self._add_group(field, value, 1, 1 if is_correct else 0)
+
+    def _add_group(self, field, value, samples, correct):
+        counts = self.groups.setdefault(field, {})
+        if value not in counts and len(counts) >= MAX_GROUPS_PER_FIELD:
+            value = OTHER_GROUP
+        entry = counts.setdefault(value, [0, 0])
+        entry[0] += samples
+        entry[1] += correct
+
+    def merge(self, other: "RunningStats"):
+        self.processed += other.processed
+        self.correct += other.correct
+        self.instruction_followed += other.instruction_followed
+        self.total_latency += other.total_latency
+        self.total_tokens += other.total_tokens
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.latency.merge(other.latency)
+        self.tokens.merge(other.tokens)
+        self.ttft.merge(other.ttft)
+        for error, n in other.errors.items():
+            self.errors[error] = self.errors.get(error, 0) + n
+        for field, counts in other.groups.items():
+            for value, (samples, correct) in counts.items():
+                self._add_group(field, value, samples, correct)
+
+    def to_dict(self) -> dict:
+        return {
+            "processed": self.processed,
+            "correct": self.correct,
+            "instruction_followed": self.instruction_followed,
+            "total_latency": self.total_latency,
+            "total_tokens": self.total_tokens,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "latency": self.latency.to_dict(),
+            "tokens": self.tokens.to_dict(),
+            "ttft": self.ttft.to_dict(),
+            "errors": self.errors,
+            "groups": self.groups,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningStats":
+        stats = cls()
+        for key in ("processed", "correct", "instruction_followed", "total_latency", "total_tokens", "cache_hits"):
+            setattr(stats, key, data[key])
+        stats.cache_misses = data.get("cache_misses", 0)
+        stats.latency = LogHistogram.from_dict(data["latency"])
+        # Absent in summaries written before these were tracked
+        if "tokens" in data:
+            stats.tokens = LogHistogram.from_dict(data["tokens"])
+        if "ttft" in data:
+            stats.ttft = LogHistogram.from_dict(data["ttft"])
+        stats.errors = dict(data.get("errors", {}))
+        stats.groups = {field: {v: list(c) for v, c in counts.items()} for field, counts in data.get("groups", {}).items()}
+        return stats
+
+    def _mean(self, total):
+        return total / self.processed if self.processed > 0 else 0
+
+    def snapshot(self) -> dict:
+        """Values for the aggregate columns on EvaluationLog."""
+        return {
+            "processed_samples": self.processed,
+            "accuracy": self._mean(self.correct),
+            "avg_latency_ms": self._mean(self.total_latency),
+            "avg_tokens": self._mean(self.total_tokens),
+            "p50_latency_ms": self.latency.quantile(0.50),
+            "p95_latency_ms": self.latency.quantile(0.95),
+            "p99_latency_ms": self.latency.quantile(0.99),
+            "p50_ttft_ms": self.ttft.quantile(0.50),
+            "p95_ttft_ms": self.ttft.quantile(0.95),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+    def columns(self) -> dict:
+        """snapshot() plus the serialized summaries, i.e. everything persisted on EvaluationLog."""
+        return {**self.snapshot(), "analytics_json": json.dumps(self.to_dict())}
+
+    def report(self) -> dict:
+        """Full analytics: distributions, error classes and per-group accuracy."""
+        return {
+            **self.snapshot(),
+            "instruction_followed_rate": self._mean(self.instruction_followed),
+            "latency_ms": self.latency.summary(),
+            "tokens": self.tokens.summary(),
+            "ttft_ms": self.ttft.summary(),
+            "errors": self.errors,
+            "groups": {
+                field: {
+                    value: {"samples": samples, "accuracy": correct / samples if samples else 0}
+                    for value, (samples, correct) in counts.items()
+                }
+                for field, counts in self.groups.items()
+            },
+        }
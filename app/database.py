@@ -1,10 +1,36 @@
+from functools import lru_cache
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.config import get_settings
+from app.core.metrics import GaugeFunc
 
 settings = get_settings()
 
-# Use pymysql for sync operations (like startup table creation)
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, echo=False)
+def _pool_options(uri: str) -> dict:
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING, "pool_recycle": settings.DB_POOL_RECYCLE}
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite":
+        # SQLite picks its own pool class (a single shared connection for :memory:)
+        if url.database and url.database != ":memory:":
+            options["connect_args"] = {"check_same_thread": False}
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
+
+# Sync engine (pymysql) for startup table creation and work that runs in
+# threads: result bulk inserts, exports, re-scoring, shard bookkeeping
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, echo=False, **_pool_options(settings.SQLALCHEMY_DATABASE_URI))
+
+@lru_cache()
+def get_async_engine() -> AsyncEngine:
+    """Engine (aiomysql / aiosqlite) for queries made from the event loop: API handlers and run bookkeeping."""
+    return create_async_engine(settings.ASYNC_DATABASE_URI, echo=False, **_pool_options(settings.ASYNC_DATABASE_URI))
 
 def init_db():
     SQLModel.metadata.create_all(engine)
@@ -13,3 +39,38 @@ def get_session():
     with Session(engine) as session:
         yield session
 
+def async_session() -> AsyncSession:
+    # Objects stay readable after commit; async sessions can't lazy-load expired attributes
+    return AsyncSession(get_async_engine(), expire_on_commit=False)
+
+async def get_async_session():
+    async with async_session() as session:
+        yield session
+
+def _pool_stats(pool) -> dict:
+    stats = {"class": type(pool).__name__}
+    # Only queue pools keep counts; SQLite's single-connection pools don't
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+def pool_stats() -> dict:
+    stats = {"sync": _pool_stats(engine.pool)}
+    if get_async_engine.cache_info().currsize:
+        stats["async"] = _pool_stats(get_async_engine().pool)
+    return stats
+
+def _pool_gauge(key):
+    # QueuePool.overflow() counts up from -pool_size until the pool is full
+    def values():
+        return {(name,): max(0, stats[key]) for name, stats in pool_stats().items() if key in stats}
+    return values
+
+GaugeFunc("db_pool_size", "Connections kept in the pool, by engine", _pool_gauge("size"), ["engine"])
+GaugeFunc("db_pool_checked_out", "Connections in use, by engine", _pool_gauge("checkedout"), ["engine"])
+GaugeFunc("db_pool_overflow", "Connections opened beyond the pool size, by engine", _pool_gauge("overflow"), ["engine"])
+
+async def close_async_engine():
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
@@ -1,19 +1,50 @@
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
-from app.database import init_db
+from sqlmodel import Session, select
+from app.database import close_async_engine, engine, init_db, pool_stats
+from app.models import EvaluationLog, TaskShard, TaskStatus
+from app.core.evaluator import reserve_task
+from app.core.http_client import http_clients
+from app.core.metrics import monitor_event_loop, render
 from app.routers import auth, models, datasets, tasks
 
 settings = get_settings()
 
+def resume_interrupted_tasks():
+    # Tasks still marked RUNNING at startup were cut off by a restart;
+    # sharded tasks belong to the workers, which recover them through leases
+    with Session(engine) as session:
+        task_ids = session.exec(
+            select(EvaluationLog.id)
+            .where(EvaluationLog.status == TaskStatus.RUNNING)
+            .where(~select(TaskShard.id).where(TaskShard.task_id == EvaluationLog.id).exists())
+        ).all()
+    return [
+        asyncio.create_task(tasks.run_evaluation_task(task_id, resume=True))
+        for task_id in task_ids
+        if reserve_task(task_id)
+    ]
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Initialize DB on startup (create tables if not exist)
     init_db()
+    # Keep references so the recovered runs aren't garbage collected
+    app.state.recovered_tasks = resume_interrupted_tasks() if settings.RESUME_ON_STARTUP else []
+    lag_monitor = None
+    if settings.METRICS_LOOP_LAG_INTERVAL > 0:
+        lag_monitor = asyncio.create_task(monitor_event_loop(settings.METRICS_LOOP_LAG_INTERVAL))
     yield
+    if lag_monitor is not None:
+        lag_monitor.cancel()
+    await http_clients.close()
+    await close_async_engine()
 
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
@@ -38,6 +69,17 @@ app.include_router(models.router, prefix="/api/v1/models", tags=["models"])
 app.include_router(datasets.router, prefix="/api/v1/datasets", tags=["datasets"])
 app.include_router(tasks.router, prefix="/api/v1/tasks", tags=["tasks"])
 
+@app.get("/api/v1/health")
+def health():
+    """Liveness plus database connection pool usage."""
+    return {"status": "ok", "db_pools": pool_stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Evaluator stage timings, request/error counters, event loop lag and gauges, for Prometheus."""
+    # Rendered on the event loop, which every metric is updated from
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # UI Routes
 @app.get("/")
 def index(request: Request):
@@ -0,0 +1,165 @@
+"""Bring an existing database up to the current result storage layout.
+
+1. Create missing tables, then add every model column and index an existing
+   table lacks (create_all only creates whole tables), e.g. the result
+   timing/token columns, the task prompt and cache columns and the
+   ix_evaluationresult_task_id_* indexes.
+2. Make evaluationresult.question/ground_truth nullable and (on MySQL)
+   raw_output binary, so outputs can be stored compressed. SQLite can't
+   change a column in place, so there the table is rebuilt: copied into a
+   table with the current definition, once.
+3. Store every dataset's questions/answers once in DatasetSample.
+4. Clear the per-result copies of that text, in id ranges of --batch-size.
+5. With --compress, compress stored raw outputs the same way new ones are.
+
+Every step skips work that is already done, so an interrupted migration can
+simply be re-run.
+
+Usage: python -m app.migrate [--batch-size N] [--compress]
+"""
+import argparse
+from sqlalchemy import bindparam, exists, func, inspect, literal, select, text, update
+from sqlmodel import Session, SQLModel
+from app.config import get_settings
+from app.database import engine, init_db
+from app.models import Dataset, DatasetSample, EvaluationLog, EvaluationResult
+from app.core.compression import encode_text
+from app.core.samples import ensure_samples
+
+settings = get_settings()
+
+def _columns(table: str) -> dict:
+    return {column["name"]: column for column in inspect(engine).get_columns(table)}
+
+def _add_column_sql(table, column) -> str:
+    quote = engine.dialect.identifier_preparer.quote
+    sql = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=engine.dialect)}"
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        # Model defaults are Python-side; existing rows need them as a server default
+        value = literal(default, column.type).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+        sql += f" DEFAULT {value}"
+        if not column.nullable:
+            sql += " NOT NULL"
+    # Foreign keys aren't added: SQLite can't, and the ORM doesn't rely on them
+    return sql
+
+def _rebuild_sqlite_table(table):
+    """Recreate ``table`` from its model definition and copy the rows over."""
+    quote = engine.dialect.identifier_preparer.quote
+    old = f"{table.name}_old"
+    columns = ", ".join(quote(column.name) for column in table.columns)
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {quote(table.name)} RENAME TO {quote(old)}"))
+        # Indexes move with the renamed table; drop them so the new ones can take their names
+        for index in inspect(conn).get_indexes(old):
+            conn.execute(text(f"DROP INDEX {quote(index['name'])}"))
+        table.create(conn)
+        conn.execute(text(f"INSERT INTO {quote(table.name)} ({columns}) SELECT {columns} FROM {quote(old)}"))
+        conn.execute(text(f"DROP TABLE {quote(old)}"))
+
+def update_schema():
+    init_db()
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in present:
+                    conn.execute(text(_add_column_sql(table, column)))
+                    print(f"Added {table.name}.{column.name}")
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    print(f"Created index {index.name}")
+    columns = _columns("evaluationresult")
+    if engine.dialect.name == "sqlite" and not columns["question"]["nullable"]:
+        _rebuild_sqlite_table(EvaluationResult.__table__)
+        print("Rebuilt evaluationresult with nullable question/ground_truth")
+    if engine.dialect.name == "mysql":
+        if not columns["question"]["nullable"] or "BLOB" not in str(columns["raw_output"]["type"]).upper():
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "ALTER TABLE evaluationresult"
+                    " MODIFY question TEXT NULL, MODIFY ground_truth TEXT NULL, MODIFY raw_output BLOB NULL"
+                ))
+            print("Altered evaluationresult columns")
+
+def store_samples():
+    with Session(engine) as session:
+        dataset_ids = session.execute(select(Dataset.id).where(~Dataset.samples_stored)).scalars().all()
+    for dataset_id in dataset_ids:
+        try:
+            ensure_samples(dataset_id)
+            print(f"Stored samples of dataset {dataset_id}")
+        except OSError as e:
+            # Results keep their own text until the dataset file is back
+            print(f"Dataset {dataset_id}: {e}")
+
+def _id_ranges(batch_size: int):
+    with Session(engine) as session:
+        max_id = session.execute(select(func.max(EvaluationResult.id))).scalar() or 0
+    for low in range(0, max_id, batch_size):
+        yield low, min(low + batch_size, max_id)
+
+def clear_result_text(batch_size: int):
+    results = EvaluationResult.__table__
+    has_sample = exists().where(
+        EvaluationLog.id == results.c.task_id,
+        DatasetSample.dataset_id == EvaluationLog.dataset_id,
+        DatasetSample.line_index == results.c.sample_index,
+    )
+    cleared = 0
+    for low, high in _id_ranges(batch_size):
+        with Session(engine) as session:
+            cleared += session.execute(
+                update(results)
+                .where(results.c.id > low, results.c.id <= high)
+                .where(results.c.question.is_not(None), results.c.sample_index.is_not(None), has_sample)
+                .values(question=None, ground_truth=None)
+            ).rowcount
+            session.commit()
+    print(f"Cleared question/ground_truth from {cleared} results")
+
+def compress_outputs(batch_size: int):
+    results = EvaluationResult.__table__
+    rewritten = 0
+    for low, high in _id_ranges(batch_size):
+        with Session(engine) as session:
+            rows = session.execute(
+                select(results.c.id, results.c.raw_output)
+                .where(results.c.id > low, results.c.id <= high)
+                .where(func.length(results.c.raw_output) >= settings.RESULT_COMPRESS_MIN_BYTES)
+            ).all()
+            # Values come back decoded, so outputs compressed earlier are simply re-encoded
+            params = [
+                {"row_id": row_id, "output": encode_text(output, True, settings.RESULT_COMPRESS_MIN_BYTES)}
+                for row_id, output in rows
+            ]
+            if params:
+                session.execute(
+                    update(results).where(results.c.id == bindparam("row_id")).values(raw_output=bindparam("output")),
+                    params,
+                )
+                session.commit()
+            rewritten += len(params)
+    print(f"Re-encoded {rewritten} raw outputs of at least {settings.RESULT_COMPRESS_MIN_BYTES} bytes")
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate stored results to the current storage layout.")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Result ids per UPDATE")
+    parser.add_argument("--compress", action="store_true", help="Also compress existing raw outputs")
+    args = parser.parse_args()
+
+    update_schema()
+    store_samples()
+    clear_result_text(args.batch_size)
+    if args.compress:
+        compress_outputs(args.batch_size)
+
+if __name__ == "__main__":
+    main()
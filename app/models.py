@@ -1,7 +1,13 @@
-from typing import Optional, List
+import json
+from typing import Any, Dict, Optional, List
 from datetime import datetime
+from sqlalchemy import Index, Text
 from sqlmodel import SQLModel, Field, Relationship
 from enum import Enum
+from app.config import get_settings
+from app.core.compression import CompressedText
+
+settings = get_settings()
 
 class TaskStatus(str, Enum):
     PENDING = "pending"
@@ -9,6 +15,12 @@ class TaskStatus(str, Enum):
     COMPLETED = "completed"
     FAILED = "failed"
 
+class ShardStatus(str, Enum):
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
 # --- Tables ---
 
 class User(SQLModel, table=True):
@@ -23,6 +35,15 @@ class LLMModel(SQLModel, table=True):
     api_key: str
     concurrency_limit: int = Field(default=5)
     model_name_identifier: str = Field(description="The model string to pass in API requests, e.g., 'gpt-3.5-turbo'")
+    # Opt-in request batching: above 1, samples are grouped (up to batch_size,
+    # or whatever arrived within batch_window_ms) into one multi-prompt
+    # /completions request, e.g. for vLLM or other local servers
+    batch_size: int = Field(default=1)
+    batch_window_ms: int = Field(default=20)
+    # Stream responses to measure time to first token; optionally close the
+    # stream once the "answer: ..." line is complete (ignored in batch mode)
+    stream: bool = Field(default=False)
+    stop_at_answer: bool = Field(default=False)
 
     tasks: List["EvaluationLog"] = Relationship(back_populates="model")
 
@@ -30,49 +51,170 @@ class Dataset(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(unique=True, index=True)
     file_path: str
+    # Preprocessed binary form written at upload (see app.core.dataset)
+    samples_path: Optional[str] = None
+    index_path: Optional[str] = None
+    # SHA-256 of the uploaded bytes; datasets with the same content share files
+    content_hash: Optional[str] = Field(default=None, index=True)
     total_count: int = Field(default=0)
+    # Set once every line's question/answer is in DatasetSample
+    samples_stored: bool = Field(default=False)
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
 
     tasks: List["EvaluationLog"] = Relationship(back_populates="dataset")
 
+class DatasetSample(SQLModel, table=True):
+    """Question and answer of one dataset line, stored once and shared by every task on the dataset"""
+    dataset_id: int = Field(foreign_key="dataset.id", primary_key=True)
+    line_index: int = Field(primary_key=True)
+    question: str = Field(sa_type=Text)
+    ground_truth: str = Field(sa_type=Text)
+
+class DatasetUpload(SQLModel, table=True):
+    """An in-progress resumable upload; chunks are appended to UPLOAD_DIR/uploads/<id>.part"""
+    id: str = Field(primary_key=True)
+    name: str
+    received_bytes: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class RunGroup(SQLModel, table=True):
+    """One dataset evaluated against several models in a single pass"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    dataset_id: int = Field(foreign_key="dataset.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    tasks: List["EvaluationLog"] = Relationship(back_populates="run_group")
+
 class EvaluationLog(SQLModel, table=True):
     """Represents a single evaluation run (Task/Log)"""
     id: Optional[int] = Field(default=None, primary_key=True)
     model_id: int = Field(foreign_key="llmmodel.id")
     dataset_id: int = Field(foreign_key="dataset.id")
+    run_group_id: Optional[int] = Field(default=None, foreign_key="rungroup.id", index=True)
     
     status: TaskStatus = Field(default=TaskStatus.PENDING)
     start_time: Optional[datetime] = Field(default=None)
     end_time: Optional[datetime] = Field(default=None)
     
-    # Aggregate Stats (Updated after completion)
+    # Aggregate Stats (Checkpointed while running, final after completion)
     accuracy: Optional[float] = Field(default=None, description="0.0 to 1.0")
     avg_latency_ms: Optional[float] = Field(default=None)
     avg_tokens: Optional[float] = Field(default=None)
+    p50_latency_ms: Optional[float] = Field(default=None)
+    p95_latency_ms: Optional[float] = Field(default=None)
+    p99_latency_ms: Optional[float] = Field(default=None)
+    p50_ttft_ms: Optional[float] = Field(default=None)
+    p95_ttft_ms: Optional[float] = Field(default=None)
+    # Serialized RunningStats (histograms, error classes, group accuracy);
+    # served by /tasks/{id}/analytics rather than with every task listing
+    analytics_json: Optional[str] = Field(default=None, sa_type=Text, exclude=True)
     total_samples: int = Field(default=0)
     processed_samples: int = Field(default=0)
 
+    # Response cache
+    use_cache: bool = Field(default=True, description="Reuse cached responses for identical deterministic requests")
+    cache_hits: int = Field(default=0)
+    # Lookups that went to the model (uncacheable samples count as neither)
+    cache_misses: int = Field(default=0)
+
+    # Prompting (see app.core.prompts); None means the built-in defaults
+    system_prompt: Optional[str] = Field(default=None, sa_type=Text)
+    user_template: Optional[str] = Field(default=None, sa_type=Text)
+    few_shot_json: Optional[str] = Field(default=None, sa_type=Text)
+    generation_params_json: Optional[str] = Field(default=None, sa_type=Text)
+
     model: Optional[LLMModel] = Relationship(back_populates="tasks")
     dataset: Optional[Dataset] = Relationship(back_populates="tasks")
+    run_group: Optional[RunGroup] = Relationship(back_populates="tasks")
     results: List["EvaluationResult"] = Relationship(back_populates="task")
 
+class FewShotExample(SQLModel):
+    user: str
+    assistant: str
+
+class TaskConfig(SQLModel):
+    """Optional request body when creating tasks; templates use {field} placeholders from the dataset row"""
+    system_prompt: Optional[str] = None
+    user_template: Optional[str] = None
+    few_shot: List[FewShotExample] = []
+    generation_params: Dict[str, Any] = {}
+
+    def columns(self) -> dict:
+        return {
+            "system_prompt": self.system_prompt,
+            "user_template": self.user_template,
+            "few_shot_json": json.dumps([ex.model_dump() for ex in self.few_shot]) if self.few_shot else None,
+            "generation_params_json": json.dumps(self.generation_params) if self.generation_params else None,
+        }
+
 class EvaluationResult(SQLModel, table=True):
     """Detailed result for each sample in a task"""
+    # Results are always read per task in id order (keyset pages, exports);
+    # the second index serves the "only (in)correct" filter the same way
+    __table_args__ = (
+        Index("ix_evaluationresult_task_id_id", "task_id", "id"),
+        Index("ix_evaluationresult_task_id_is_correct_id", "task_id", "is_correct", "id"),
+        # Aligns two tasks' results line by line for diffs
+        Index("ix_evaluationresult_task_id_sample_index", "task_id", "sample_index"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     task_id: int = Field(foreign_key="evaluationlog.id")
+    sample_index: Optional[int] = Field(default=None, description="0-based line number in the dataset file")
     
-    question: str = Field(sa_column_kwargs={"type_": "TEXT"})
-    ground_truth: str = Field(sa_column_kwargs={"type_": "TEXT"}) # From 'a' in JSONL
+    # Only set on rows without a sample_index or written before samples were
+    # stored per dataset; otherwise read from DatasetSample (see app.core.samples)
+    question: Optional[str] = Field(default=None, sa_type=Text)
+    ground_truth: Optional[str] = Field(default=None, sa_type=Text) # From 'a' in JSONL
     
     # Model Output
-    raw_output: Optional[str] = Field(default=None, sa_column_kwargs={"type_": "TEXT"}) # From 'gen' or API response
+    raw_output: Optional[str] = Field(
+        default=None,
+        sa_type=CompressedText(settings.RESULT_COMPRESS_OUTPUT, settings.RESULT_COMPRESS_MIN_BYTES),
+    ) # From 'gen' or API response
     extracted_answer: Optional[str] = Field(default=None) # Parsed via Regex
     
     # Metrics
     is_correct: bool = Field(default=False)
     instruction_followed: bool = Field(default=False, description="Found 'answer:' pattern")
     latency_ms: float = Field(default=0.0)
+    # As reported by the server (prompt + completion); a stream closed early
+    # only knows its completion chunks. Token stats use completion_tokens,
+    # falling back to tokens_used for rows written before it was recorded
     tokens_used: int = Field(default=0)
+    prompt_tokens: Optional[int] = Field(default=None)
+    completion_tokens: Optional[int] = Field(default=None)
+    # Streaming only: time to first token, mean gap between tokens, decode rate
+    ttft_ms: Optional[float] = Field(default=None)
+    inter_token_ms: Optional[float] = Field(default=None)
+    tokens_per_sec: Optional[float] = Field(default=None)
+    stopped_early: bool = Field(default=False, description="Stream closed once the answer line was complete")
     
     task: Optional[EvaluationLog] = Relationship(back_populates="results")
 
+class TaskShard(SQLModel, table=True):
+    """A slice of a task's dataset lines, leased to one worker process at a time"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    task_id: int = Field(foreign_key="evaluationlog.id", index=True)
+    start_line: int
+    end_line: int # Exclusive
+
+    status: ShardStatus = Field(default=ShardStatus.PENDING, index=True)
+    lease_owner: Optional[str] = Field(default=None)
+    lease_expires_at: Optional[datetime] = Field(default=None)
+    # Attempts that failed or were abandoned by a dead worker, not plain claims
+    attempts: int = Field(default=0)
+
+    # Serialized RunningStats for this shard, merged into the task's aggregates
+    # when the last shard finishes; the counts below give live progress
+    stats_json: Optional[str] = Field(default=None, sa_type=Text)
+    processed_samples: int = Field(default=0)
+    correct_samples: int = Field(default=0)
+
+class TaskDiff(SQLModel, table=True):
+    """Cached comparison summary of two tasks, valid while its fingerprint matches both"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    task_a_id: int = Field(foreign_key="evaluationlog.id", index=True)
+    task_b_id: int = Field(foreign_key="evaluationlog.id")
+    fingerprint: str
+    summary_json: str = Field(sa_type=Text)
+    computed_at: datetime = Field(default_factory=datetime.utcnow)
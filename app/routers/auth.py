@@ -1,18 +1,21 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
-from app.database import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import get_async_session
 from app.models import User
-from app.core.security import create_access_token, get_password_hash, verify_password, settings
+from app.core.security import (
+    create_access_token, get_password_hash_async, user_cache, verify_password_async, settings,
+)
 
 router = APIRouter()
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_async_session)):
     statement = select(User).where(User.username == form_data.username)
-    user = session.exec(statement).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = (await session.exec(statement)).first()
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -20,19 +23,20 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = D
         )
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/register")
-def register(username: str, password: str, session: Session = Depends(get_session)):
+async def register(username: str, password: str, session: AsyncSession = Depends(get_async_session)):
     statement = select(User).where(User.username == username)
-    existing_user = session.exec(statement).first()
+    existing_user = (await session.exec(statement)).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    new_user = User(username=username, hashed_password=get_password_hash(password))
+    new_user = User(username=username, hashed_password=await get_password_hash_async(password))
     session.add(new_user)
-    session.commit()
+    await session.commit()
+    user_cache.invalidate(username)
     return {"msg": "User created successfully"}
 
@@ -1,45 +1,188 @@
-import shutil
+import asyncio
 import os
+import uuid
 from typing import List
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from sqlmodel import Session, select
-from app.database import get_session
-from app.models import Dataset
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import get_async_session
+from app.models import Dataset, DatasetUpload
 from app.config import get_settings
 from app.core.security import get_current_user
+from app.core.dataset import DatasetIngest, DatasetSchemaError, StoredDataset, ingest_file
 
 router = APIRouter()
 settings = get_settings()
 
+async def _ensure_name_available(session: AsyncSession, name: str):
+    # Checked up front so a clash doesn't surface only after a large upload
+    if (await session.exec(select(Dataset.id).where(Dataset.name == name))).first() is not None:
+        raise HTTPException(status_code=409, detail="Dataset name already exists")
+
+async def _create_dataset(session: AsyncSession, name: str, stored: StoredDataset) -> Dataset:
+    dataset = Dataset(
+        name=name,
+        file_path=stored.file_path,
+        samples_path=stored.samples_path,
+        index_path=stored.index_path,
+        content_hash=stored.content_hash,
+        total_count=stored.line_count,
+    )
+    session.add(dataset)
+    await session.commit()
+    await session.refresh(dataset)
+    return dataset
+
 @router.post("/upload", response_model=Dataset)
 async def upload_dataset(
     name: str, 
     file: UploadFile = File(...), 
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_user)
 ):
-    # Ensure upload directory exists
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    
-    file_location = f"{settings.UPLOAD_DIR}/{file.filename}"
-    
-    # Save file
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    # Count lines (simple implementation)
-    count = 0
-    with open(file_location, "r", encoding="utf-8") as f:
-        for _ in f:
-            count += 1
-            
-    dataset = Dataset(name=name, file_path=file_location, total_count=count)
-    session.add(dataset)
-    session.commit()
-    session.refresh(dataset)
+    await _ensure_name_available(session, name)
+
+    # Hash, validate and preprocess chunk by chunk; disk work runs in a
+    # thread so the event loop keeps serving other requests meanwhile
+    ingest = DatasetIngest(settings.UPLOAD_DIR)
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            await asyncio.to_thread(ingest.feed, chunk)
+        stored = await asyncio.to_thread(ingest.finish)
+    except DatasetSchemaError as e:
+        ingest.discard()
+        raise HTTPException(status_code=422, detail=e.errors)
+    except Exception:
+        ingest.discard()
+        raise
+
+    return await _create_dataset(session, name, stored)
+
+# --- Resumable uploads ---
+#
+# POST /uploads starts one, PUT /uploads/{id}?offset=N appends the raw request
+# body at byte N (409 with the server's offset if the client is out of step),
+# GET /uploads/{id} reports how much arrived, and POST /uploads/{id}/complete
+# validates the assembled file and creates the dataset.
+
+# One lock per upload in this process, so concurrent requests for the same
+# upload never write its .part file at the same time
+_upload_locks = {}
+
+def _upload_lock(upload_id: str) -> asyncio.Lock:
+    return _upload_locks.setdefault(upload_id, asyncio.Lock())
+
+def _part_path(upload_id: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, "uploads", f"{upload_id}.part")
+
+def _create_part(upload_id: str):
+    os.makedirs(os.path.dirname(_part_path(upload_id)), exist_ok=True)
+    open(_part_path(upload_id), "wb").close()
+
+def _open_part(upload_id: str, offset: int):
+    part = open(_part_path(upload_id), "r+b")
+    # Drop the tail of an earlier chunk that was cut off mid-transfer
+    part.truncate(offset)
+    part.seek(offset)
+    return part
+
+def _remove_part(upload_id: str):
+    if os.path.exists(_part_path(upload_id)):
+        os.remove(_part_path(upload_id))
+
+async def _get_upload(session: AsyncSession, upload_id: str) -> DatasetUpload:
+    upload = await session.get(DatasetUpload, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@router.post("/uploads", response_model=DatasetUpload)
+async def create_upload(name: str, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    await _ensure_name_available(session, name)
+    upload = DatasetUpload(id=uuid.uuid4().hex, name=name)
+    await asyncio.to_thread(_create_part, upload.id)
+    session.add(upload)
+    await session.commit()
+    await session.refresh(upload)
+    return upload
+
+@router.get("/uploads/{upload_id}", response_model=DatasetUpload)
+async def read_upload(upload_id: str, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    return await _get_upload(session, upload_id)
+
+@router.put("/uploads/{upload_id}", response_model=DatasetUpload)
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_user)
+):
+    async with _upload_lock(upload_id):
+        # Read under the lock: a request that waited sees the previous one's offset
+        upload = await _get_upload(session, upload_id)
+        if offset != upload.received_bytes:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Offset does not match received bytes", "received_bytes": upload.received_bytes},
+            )
+
+        part = await asyncio.to_thread(_open_part, upload_id, offset)
+        try:
+            buffered = bytearray()
+            async for data in request.stream():
+                buffered += data
+                if len(buffered) >= settings.UPLOAD_CHUNK_SIZE:
+                    await asyncio.to_thread(part.write, bytes(buffered))
+                    buffered.clear()
+            if buffered:
+                await asyncio.to_thread(part.write, bytes(buffered))
+            received = part.tell()
+        finally:
+            await asyncio.to_thread(part.close)
+
+        # Conditional on the offset we started from, so a request served by
+        # another process in the meantime can't be silently overwritten
+        result = await session.exec(
+            update(DatasetUpload)
+            .where(DatasetUpload.id == upload_id, DatasetUpload.received_bytes == offset)
+            .values(received_bytes=received)
+        )
+        await session.commit()
+        if result.rowcount != 1:
+            raise HTTPException(status_code=409, detail="Upload was modified concurrently")
+        await session.refresh(upload)
+        return upload
+
+@router.post("/uploads/{upload_id}/complete", response_model=Dataset)
+async def complete_upload(upload_id: str, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    async with _upload_lock(upload_id):
+        upload = await _get_upload(session, upload_id)
+        await _ensure_name_available(session, upload.name)
+        try:
+            stored = await asyncio.to_thread(
+                ingest_file, _part_path(upload_id), settings.UPLOAD_DIR, settings.UPLOAD_CHUNK_SIZE
+            )
+        except DatasetSchemaError as e:
+            raise HTTPException(status_code=422, detail=e.errors)
+
+        name = upload.name
+        await session.delete(upload)
+        dataset = await _create_dataset(session, name, stored)
+        await asyncio.to_thread(_remove_part, upload_id)
+    _upload_locks.pop(upload_id, None)
     return dataset
 
-@router.get("/", response_model=List[Dataset])
-def read_datasets(session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    return session.exec(select(Dataset)).all()
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    async with _upload_lock(upload_id):
+        upload = await _get_upload(session, upload_id)
+        await session.delete(upload)
+        await session.commit()
+        await asyncio.to_thread(_remove_part, upload_id)
+    _upload_locks.pop(upload_id, None)
+    return {"msg": "Upload aborted"}
 
+@router.get("/", response_model=List[Dataset])
+async def read_datasets(session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    return (await session.exec(select(Dataset))).all()
@@ -1,57 +1,428 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
-from sqlmodel import Session, select
-from app.database import get_session
-from app.models import EvaluationLog, EvaluationResult, TaskStatus
-from app.core.evaluator import AsyncEvaluator
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.database import async_session, get_async_session
+from app.config import get_settings
+from app.models import Dataset, EvaluationLog, EvaluationResult, LLMModel, RunGroup, TaskConfig, TaskStatus
+from app.core.evaluator import AsyncEvaluator, ACTIVE_EVALUATORS, release_task, reserve_task
+from app.core.fanout import FanOutEvaluator
+from app.core.profiling import PROFILE_TOOLS, ProfileError, profile_task
+from app.core.prompts import RequestBuilder
+from app.core.rescore import rescore_task
+from app.core.results import (
+    ARROW_FORMATS, EXPORT_MEDIA_TYPES, arrow_available, export_csv, export_ndjson, export_results,
+    iter_batches, parse_fields, results_query,
+)
+from app.core.diff import FLIP_FIELDS, DiffError, flips_query, get_diff, load_pair
+from app.core.stats import RunningStats
+from app.core.shards import enqueue_task, requeue_failed_shards, task_has_open_shards, task_has_shards
 from app.core.security import get_current_user
 
 router = APIRouter()
+settings = get_settings()
 
-async def run_evaluation_task(task_id: int):
-    evaluator = AsyncEvaluator(task_id)
-    await evaluator.run()
+async def run_evaluation_task(task_id: int, resume: bool = False):
+    # Callers reserve the task (reserve_task) before scheduling this
+    try:
+        evaluator = AsyncEvaluator(task_id, resume=resume)
+        await evaluator.run()
+    finally:
+        release_task(task_id)
+
+def _config_columns(config: Optional[TaskConfig]) -> dict:
+    """Prompt/parameter columns for new tasks, rejecting templates that would fail mid-run."""
+    if config is None:
+        return {}
+    try:
+        RequestBuilder(
+            "", config.system_prompt, config.user_template,
+            [ex.model_dump() for ex in config.few_shot], config.generation_params,
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return config.columns()
 
 @router.post("/", response_model=EvaluationLog)
 async def create_task(
     model_id: int, 
     dataset_id: int, 
     background_tasks: BackgroundTasks,
-    session: Session = Depends(get_session),
+    use_cache: bool = True,
+    config: Optional[TaskConfig] = None,
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_user)
 ):
-    task = EvaluationLog(model_id=model_id, dataset_id=dataset_id, status=TaskStatus.PENDING)
+    dataset = await session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    task = EvaluationLog(
+        model_id=model_id, dataset_id=dataset_id, status=TaskStatus.PENDING, use_cache=use_cache,
+        **_config_columns(config),
+    )
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.commit()
+    await session.refresh(task)
     
-    background_tasks.add_task(run_evaluation_task, task.id)
+    if settings.EVALUATION_BACKEND == "worker":
+        # Picked up by `python -m app.worker` processes
+        await session.run_sync(enqueue_task, task, dataset.total_count)
+        await session.refresh(task)
+    else:
+        reserve_task(task.id)
+        background_tasks.add_task(run_evaluation_task, task.id)
+    return task
+
+async def run_comparison(task_ids: List[int], dataset: Dataset):
+    try:
+        await FanOutEvaluator(task_ids).run(dataset)
+    finally:
+        for task_id in task_ids:
+            release_task(task_id)
+
+@router.post("/compare", response_model=RunGroup)
+async def create_comparison(
+    dataset_id: int,
+    background_tasks: BackgroundTasks,
+    model_ids: List[int] = Query(...),
+    use_cache: bool = True,
+    config: Optional[TaskConfig] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_user)
+):
+    """Evaluate one dataset against several models, reading the dataset once."""
+    dataset = await session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    model_ids = list(dict.fromkeys(model_ids))
+    columns = _config_columns(config)
+    found = (await session.exec(select(LLMModel.id).where(LLMModel.id.in_(model_ids)))).all()
+    if len(found) != len(model_ids):
+        raise HTTPException(status_code=404, detail="Model not found")
+
+    group = RunGroup(dataset_id=dataset_id)
+    session.add(group)
+    await session.commit()
+    await session.refresh(group)
+    tasks = [
+        EvaluationLog(
+            model_id=model_id, dataset_id=dataset_id, run_group_id=group.id,
+            status=TaskStatus.PENDING, use_cache=use_cache, **columns,
+        )
+        for model_id in model_ids
+    ]
+    session.add_all(tasks)
+    await session.commit()
+    task_ids = [task.id for task in tasks]
+
+    if settings.EVALUATION_BACKEND == "worker":
+        # Workers evaluate shards independently; each task is queued on its own
+        for task in tasks:
+            await session.run_sync(enqueue_task, task, dataset.total_count)
+    else:
+        for task_id in task_ids:
+            reserve_task(task_id)
+        background_tasks.add_task(run_comparison, task_ids, dataset)
+    await session.refresh(group)
+    return group
+
+@router.get("/groups/{group_id}")
+async def read_comparison(group_id: int, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    """Leaderboard for a comparison run, best accuracy first."""
+    group = await session.get(RunGroup, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Run group not found")
+    rows = (await session.exec(
+        select(EvaluationLog, LLMModel.name)
+        .join(LLMModel, LLMModel.id == EvaluationLog.model_id)
+        .where(EvaluationLog.run_group_id == group_id)
+    )).all()
+    leaderboard = [
+        {
+            "task_id": task.id,
+            "model_id": task.model_id,
+            "model_name": model_name,
+            "status": task.status,
+            "processed_samples": task.processed_samples,
+            "total_samples": task.total_samples,
+            "accuracy": task.accuracy,
+            "avg_latency_ms": task.avg_latency_ms,
+            "p95_latency_ms": task.p95_latency_ms,
+            "avg_tokens": task.avg_tokens,
+        }
+        for task, model_name in rows
+    ]
+    leaderboard.sort(key=lambda row: (row["accuracy"] is None, -(row["accuracy"] or 0)))
+    return {"group": group, "leaderboard": leaderboard}
+
+@router.post("/{task_id}/resume", response_model=EvaluationLog)
+async def resume_task(
+    task_id: int,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_user)
+):
+    """Re-enter a failed or interrupted run, processing only the missing samples."""
+    task = await session.get(EvaluationLog, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.status == TaskStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="Task is already completed")
+    # Claimed before the first await below, so a second request can't pass too
+    if not reserve_task(task_id):
+        raise HTTPException(status_code=409, detail="Task is already running")
+
+    scheduled = False
+    try:
+        if await session.run_sync(task_has_shards, task_id):
+            # Worker-run task: expired leases are retried automatically, only failed shards need a nudge
+            await session.run_sync(requeue_failed_shards, task_id)
+            await session.refresh(task)
+        else:
+            background_tasks.add_task(run_evaluation_task, task.id, True)
+            scheduled = True
+    finally:
+        if not scheduled:
+            release_task(task_id)
+    return task
+
+async def run_rescore_task(task_id: int):
+    try:
+        await asyncio.to_thread(rescore_task, task_id)
+    except Exception as e:
+        print(f"Rescore Failed: {e}")
+    finally:
+        release_task(task_id)
+
+@router.post("/{task_id}/rescore", response_model=EvaluationLog)
+async def rescore(
+    task_id: int,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_user)
+):
+    """Recompute correctness from stored raw outputs without calling the model again."""
+    task = await session.get(EvaluationLog, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    # The status and shard leases cover runs in other processes and on workers;
+    # the reservation covers one about to start here
+    if task.status == TaskStatus.RUNNING or await session.run_sync(task_has_open_shards, task_id):
+        raise HTTPException(status_code=409, detail="Task is still running")
+    if not reserve_task(task_id):
+        raise HTTPException(status_code=409, detail="Task is still running")
+
+    background_tasks.add_task(run_rescore_task, task.id)
     return task
 
 @router.get("/", response_model=List[EvaluationLog])
-def read_tasks(session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    return session.exec(select(EvaluationLog).order_by(EvaluationLog.id.desc())).all()
+async def read_tasks(session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    return (await session.exec(select(EvaluationLog).order_by(EvaluationLog.id.desc()))).all()
 
 @router.get("/{task_id}", response_model=EvaluationLog)
-def read_task(task_id: int, session: Session = Depends(get_session), current_user = Depends(get_current_user)):
-    task = session.get(EvaluationLog, task_id)
+async def read_task(task_id: int, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    task = await session.get(EvaluationLog, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
-@router.get("/{task_id}/results", response_model=List[EvaluationResult])
-def read_task_results(
+@router.get("/{task_id}/stats")
+async def read_task_stats(task_id: int, current_user = Depends(get_current_user)):
+    """Live runtime metrics for a task running in this process."""
+    evaluator = ACTIVE_EVALUATORS.get(task_id)
+    if not evaluator:
+        raise HTTPException(status_code=404, detail="Task is not running")
+    return evaluator.stats()
+
+@router.post("/{task_id}/profile")
+async def profile_running_task(
+    task_id: int,
+    seconds: float = Query(30.0, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    tool: str = Query("cprofile", description="cprofile or py-spy"),
+    current_user = Depends(get_current_user),
+):
+    """Profile this process while the task runs here; the file is written to PROFILE_DIR."""
+    if tool not in PROFILE_TOOLS:
+        raise HTTPException(status_code=400, detail=f"tool must be one of {', '.join(PROFILE_TOOLS)}")
+    if task_id not in ACTIVE_EVALUATORS:
+        raise HTTPException(status_code=404, detail="Task is not running")
+    try:
+        return await profile_task(task_id, seconds, tool, lambda: task_id in ACTIVE_EVALUATORS)
+    except ProfileError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/{task_id}/analytics")
+async def read_task_analytics(task_id: int, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    """Latency/token distributions, error classes and per-group accuracy.
+
+    Served from the summary kept with the task (live from memory while it
+    runs here), so the cost doesn't depend on how many results it has.
+    """
+    evaluator = ACTIVE_EVALUATORS.get(task_id)
+    if evaluator:
+        return evaluator.aggregates.report()
+    task = await session.get(EvaluationLog, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not task.analytics_json:
+        return RunningStats().report()
+    return RunningStats.from_dict(json.loads(task.analytics_json)).report()
+
+@router.get("/{task_id}/diff/{other_id}")
+async def read_task_diff(task_id: int, other_id: int, session: AsyncSession = Depends(get_async_session), current_user = Depends(get_current_user)):
+    """Paired comparison of two tasks on the same dataset (b = other_id against a = task_id).
+
+    Flip counts with McNemar's test, plus mean latency/token deltas with a
+    paired significance test. Cached once both tasks have finished.
+    """
+    try:
+        return await session.run_sync(get_diff, task_id, other_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DiffError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{task_id}/diff/{other_id}/flips")
+async def stream_task_flips(
+    task_id: int,
+    other_id: int,
+    kind: str = Query("all", pattern="^(all|regressed|improved)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_user)
+):
+    """Stream the samples whose correctness differs between the two tasks."""
+    try:
+        await session.run_sync(load_pair, task_id, other_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DiffError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    batches = iter_batches(flips_query(task_id, other_id, kind))
+    body = export_ndjson(batches, FLIP_FIELDS) if format == "ndjson" else export_csv(batches, FLIP_FIELDS)
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="diff_{task_id}_{other_id}_{kind}.{format}"'},
+    )
+
+def _sse(event: str, data, seq: Optional[int] = None) -> str:
+    lines = [] if seq is None else [f"id: {seq}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+@router.get("/{task_id}/events")
+async def stream_task_events(
+    task_id: int,
+    cursor: Optional[int] = None,
+    last_event_id: Optional[str] = Header(default=None),
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_user)
+):
+    """Server-Sent Events stream of progress snapshots and scored samples.
+
+    Resume after a disconnect by passing the last received event id as
+    ``cursor`` or in the standard ``Last-Event-ID`` header. Tasks not being
+    evaluated in this process (queued, on shard workers or in another API
+    process) only get progress snapshots, read from the task row every
+    EVENTS_POLL_INTERVAL seconds, until they finish.
+    """
+    task = await session.get(EvaluationLog, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if cursor is None and last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id) + 1
+
+    async def event_stream():
+        last_state = None
+        while True:
+            evaluator = ACTIVE_EVALUATORS.get(task_id)
+            if evaluator is not None:
+                if cursor is None:
+                    yield _sse("progress", evaluator.aggregates.snapshot())
+                async for seq, event, data in evaluator.events.subscribe(cursor):
+                    if event is None:
+                        yield ": keepalive\n\n"
+                        continue
+                    if event == "gap":
+                        data = {**data, **evaluator.aggregates.snapshot()}
+                    yield _sse(event, data, seq)
+                return
+            async with async_session() as poll_session:
+                row = await poll_session.get(EvaluationLog, task_id)
+            if row is None:
+                return
+            state = row.model_dump()
+            if row.status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                yield _sse("status", state)
+                return
+            if state != last_state:
+                yield _sse("progress", state)
+                last_state = state
+            else:
+                yield ": keepalive\n\n"
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{task_id}/results", response_model=List[Dict[str, Any]])
+async def read_task_results(
     task_id: int, 
-    limit: int = 100, 
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000), 
     offset: int = 0, 
-    session: Session = Depends(get_session),
+    after: Optional[int] = Query(None, description="Return results with id greater than this (the previous page's last id)"),
+    is_correct: Optional[bool] = None,
+    instruction_followed: Optional[bool] = None,
+    min_latency_ms: Optional[float] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return; id is always included"),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_user)
 ):
-    results = session.exec(
-        select(EvaluationResult)
-        .where(EvaluationResult.task_id == task_id)
-        .offset(offset)
-        .limit(limit)
-    ).all()
-    return results
+    # Prefer ``after`` (keyset) over ``offset``: its cost doesn't grow with depth
+    names = _parse_fields(fields)
+    stmt = results_query(task_id, names, is_correct, instruction_followed, min_latency_ms, after).limit(limit)
+    if after is None and offset:
+        stmt = stmt.offset(offset)
+    rows = (await session.execute(stmt)).all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [dict(row._mapping) for row in rows]
 
+@router.get("/{task_id}/export")
+async def export_task_results(
+    task_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet|arrow)$"),
+    is_correct: Optional[bool] = None,
+    instruction_followed: Optional[bool] = None,
+    min_latency_ms: Optional[float] = None,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_user)
+):
+    """Stream every matching result in one response, in constant server memory."""
+    if not await session.get(EvaluationLog, task_id):
+        raise HTTPException(status_code=404, detail="Task not found")
+    if format in ARROW_FORMATS and not arrow_available():
+        raise HTTPException(status_code=400, detail=f"{format} export requires pyarrow to be installed")
+    names = _parse_fields(fields)
+    stmt = results_query(task_id, names, is_correct, instruction_followed, min_latency_ms)
+    return StreamingResponse(
+        export_results(stmt, names, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="task_{task_id}_results.{format}"'},
+    )
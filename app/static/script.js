@@ -52,3 +52,60 @@ function checkAuth() {
     }
 }
 
+
+// Consume a Server-Sent Events endpoint with the auth header (EventSource can't send one).
+// Reconnects automatically and resumes from the last event id.
+function apiStream(endpoint, onEvent, onDone) {
+    let lastId = null;
+    let stopped = false;
+
+    async function connect() {
+        const headers = { 'Accept': 'text/event-stream' };
+        const token = getToken();
+        if (token) headers['Authorization'] = `Bearer ${token}`;
+        if (lastId !== null) headers['Last-Event-ID'] = lastId;
+
+        const response = await fetch(`${API_BASE}${endpoint}`, { headers });
+        if (response.status === 401) {
+            logout();
+            return;
+        }
+        if (!response.ok) throw new Error('Stream Error');
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (!stopped) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const chunk = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+                let event = 'message', data = '';
+                for (const line of chunk.split('\n')) {
+                    if (line.startsWith('id: ')) lastId = line.slice(4);
+                    else if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+        if (onDone) onDone();
+    }
+
+    (async () => {
+        while (!stopped) {
+            try {
+                await connect();
+                return;
+            } catch (e) {
+                console.error(e);
+                await new Promise(r => setTimeout(r, 2000));
+            }
+        }
+    })();
+
+    return () => { stopped = true; };
+}
@@ -0,0 +1,181 @@
+"""OpenAI-compatible stub server for exercising the evaluator without a network.
+
+Serves ``/v1/chat/completions`` (optionally streamed as SSE) and
+multi-prompt ``/v1/completions``. Every reply is ``answer: <last line of the
+prompt>``, so a dataset whose answers equal its questions scores 100%,
+followed by ``--tail-tokens`` words of filler. Latency is modelled like an
+inference server with a few execution slots: each request costs
+``--latency-ms`` plus ``--per-item-ms`` per prompt, which is what makes
+batching pay off, and streamed replies add ``--token-ms`` per token.
+
+``--latency-dist`` draws the per-request cost around ``--latency-ms``
+(exponential with that mean, or lognormal with that median and
+``--latency-sigma``), ``--error-rate`` answers that fraction of requests
+with ``--error-status`` after the usual delay, and ``--tail-tokens-max``
+varies the filler length per reply.
+
+Usage: python -m app.stub_server [--port 8001] [--latency-ms 50] [--per-item-ms 2] [--slots 4]
+                                 [--token-ms 0] [--tail-tokens 0] [--tail-tokens-max N]
+                                 [--latency-dist fixed|exponential|lognormal] [--latency-sigma 0.5]
+                                 [--error-rate 0] [--error-status 500] [--seed N]
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+from aiohttp import web
+
+def _answer(text: str) -> str:
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    return f"answer: {lines[-1] if lines else ''}"
+
+def _tokens(*texts) -> int:
+    # Whitespace words are close enough to tokens for a stub
+    return sum(len(t.split()) for t in texts)
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+LATENCY_DISTRIBUTIONS = ("fixed", "exponential", "lognormal")
+
+class StubServer:
+    def __init__(self, latency_ms: float = 50.0, per_item_ms: float = 2.0, slots: int = 4,
+                 token_ms: float = 0.0, tail_tokens: int = 0, tail_tokens_max: int = None,
+                 latency_dist: str = "fixed", latency_sigma: float = 0.5,
+                 error_rate: float = 0.0, error_status: int = 500, seed: int = None):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency_ms = latency_ms
+        self.per_item_ms = per_item_ms
+        self.token_ms = token_ms
+        self.tail_tokens = tail_tokens
+        self.tail_tokens_max = max(tail_tokens, tail_tokens_max or 0)
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._slots = asyncio.Semaphore(slots)
+        self.requests = 0
+        self.prompts = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def _latency(self) -> float:
+        if self.latency_ms <= 0 or self.latency_dist == "fixed":
+            return self.latency_ms
+        if self.latency_dist == "exponential":
+            return self._rng.expovariate(1 / self.latency_ms)
+        return self.latency_ms * self._rng.lognormvariate(0, self.latency_sigma)
+
+    async def _work(self, n_items: int) -> bool:
+        """Sleep for the request's service time; False if it should fail."""
+        self.requests += 1
+        self.prompts += n_items
+        async with self._slots:
+            await asyncio.sleep((self._latency() + self.per_item_ms * n_items) / 1000)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            return False
+        return True
+
+    def _error(self) -> web.Response:
+        return web.json_response({"error": {"message": "stub error"}}, status=self.error_status)
+
+    def _reply(self, prompt: str) -> str:
+        n_tail = self._rng.randint(self.tail_tokens, self.tail_tokens_max)
+        tail = " ".join(["because"] * n_tail)
+        return f"{_answer(prompt)}\n{tail}" if tail else _answer(prompt)
+
+    async def chat_completions(self, request: web.Request):
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        if not await self._work(1):
+            return self._error()
+        output = self._reply(prompt)
+        if body.get("stream"):
+            return await self._stream(request, body, prompt, output)
+        return web.json_response({
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": output}, "finish_reason": "stop"}],
+            "usage": _usage(_tokens(prompt), _tokens(output)),
+        })
+
+    async def completions(self, request: web.Request):
+        body = await request.json()
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        if not await self._work(len(prompts)):
+            return self._error()
+        outputs = [self._reply(p) for p in prompts]
+        return web.json_response({
+            "object": "text_completion",
+            "model": body.get("model"),
+            "choices": [{"index": i, "text": out, "finish_reason": "stop"} for i, out in enumerate(outputs)],
+            "usage": _usage(_tokens(*prompts), _tokens(*outputs)),
+        })
+
+    async def _stream(self, request, body, prompt, output):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(event):
+            await response.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+
+        # One chunk per word, keeping the whitespace so the text reassembles exactly
+        pieces = re.findall(r"\S+\s*|\s+", output)
+        try:
+            for piece in pieces:
+                await asyncio.sleep(self.token_ms / 1000)
+                await send({"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            await send({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if body.get("stream_options", {}).get("include_usage"):
+                await send({"choices": [], "usage": _usage(_tokens(prompt), len(pieces))})
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            # Client closed the stream early
+            self.cancelled += 1
+        return response
+
+    async def stats(self, request: web.Request):
+        return web.json_response({"requests": self.requests, "prompts": self.prompts, "cancelled": self.cancelled, "errors": self.errors})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/completions", self.completions)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fixed cost per request")
+    parser.add_argument("--per-item-ms", type=float, default=2.0, help="Extra cost per prompt in a request")
+    parser.add_argument("--slots", type=int, default=4, help="Requests served concurrently")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Delay per streamed token")
+    parser.add_argument("--tail-tokens", type=int, default=0, help="Filler words after the answer line")
+    parser.add_argument("--tail-tokens-max", type=int, default=None, help="Draw the filler length up to this many words")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Spread of the lognormal distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    async def make_app():
+        return StubServer(
+            args.latency_ms, args.per_item_ms, args.slots, args.token_ms, args.tail_tokens, args.tail_tokens_max,
+            args.latency_dist, args.latency_sigma, args.error_rate, args.error_status, args.seed,
+        ).app()
+
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Evaluator worker process: claims task shards from the database queue and runs them.
+
+Usage: python -m app.worker [--slots N] [--poll-interval SECONDS] [--worker-id ID]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+from app.config import get_settings
+from app.core.http_client import http_clients
+from app.core.shards import ShardEvaluator, claim_shard, fail_shard
+from app.database import init_db
+
+settings = get_settings()
+
+async def run_worker(worker_id: str, slots: int, poll_interval: float):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    running = set()
+    print(f"Worker {worker_id} started with {slots} slot(s)")
+    try:
+        while not stop.is_set():
+            while len(running) < slots:
+                shard = await asyncio.to_thread(claim_shard, worker_id)
+                if shard is None:
+                    break
+                if shard.attempts >= settings.SHARD_MAX_ATTEMPTS:
+                    print(f"Shard {shard.id} failed {shard.attempts} attempts, failing task {shard.task_id}")
+                    await asyncio.to_thread(fail_shard, shard.id, shard.task_id)
+                    continue
+                print(f"Claimed shard {shard.id} (task {shard.task_id}, lines {shard.start_line}-{shard.end_line})")
+                job = asyncio.create_task(ShardEvaluator(shard, worker_id).run())
+                running.add(job)
+                job.add_done_callback(running.discard)
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # Running shards release their leases when cancelled
+        for job in running:
+            job.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        await http_clients.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an evaluator worker.")
+    parser.add_argument("--slots", type=int, default=settings.WORKER_SLOTS, help="Shards evaluated concurrently")
+    parser.add_argument("--poll-interval", type=float, default=settings.WORKER_POLL_INTERVAL)
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}:{os.getpid()}")
+    args = parser.parse_args()
+    init_db()
+    asyncio.run(run_worker(args.worker_id, args.slots, args.poll_interval))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark: authentication cost per request, and what a login burst does to other requests.
+
+Part one resolves a bearer token the way every authenticated endpoint does,
+with the user cache off (one users-table query per request), on, and in
+claims-only mode. Part two fires a burst of logins while a probe keeps
+calling a trivial sync endpoint, with bcrypt run on the endpoint thread pool
+(as the sync login endpoint did) and then on the dedicated hashing pool.
+
+Usage: python -m benchmarks.bench_auth [--requests N] [--logins N] [--db-url URL]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from anyio import to_thread
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.config import Settings
+from app.core.security import (
+    create_access_token, get_current_user, get_password_hash, settings, user_cache,
+    verify_password, verify_password_async,
+)
+from app.models import User
+
+async def bench_resolver(db_url, user, requests):
+    engine = create_async_engine(Settings(DATABASE_URL=db_url).ASYNC_DATABASE_URI)
+    queries = 0
+
+    def count(*args):
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count)
+    token = create_access_token({"sub": user.username, "uid": user.id}, timedelta(minutes=5))
+    modes = (("uncached", 0.0, False), ("cached", 60.0, False), ("claims-only", 60.0, True))
+    for name, ttl, claims_only in modes:
+        user_cache.ttl = ttl
+        user_cache.invalidate()
+        settings.AUTH_CLAIMS_ONLY = claims_only
+        queries = 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            # One session per request, as get_async_session provides
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                await get_current_user(token, session)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<12} {elapsed / requests * 1e6:8.1f} us/request  {queries / requests:.3f} queries/request")
+    await engine.dispose()
+
+async def bench_logins(hashed, logins, offload):
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await to_thread.run_sync(lambda: None)
+            probe_latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.01)
+
+    async def login():
+        if offload:
+            await verify_password_async("password", hashed)
+        else:
+            await to_thread.run_sync(verify_password, "password", hashed)
+
+    probing = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probing
+    name = "hash pool" if offload else "endpoint pool"
+    print(f"  {name:<14} burst {elapsed:6.2f}s  probe p50 {statistics.median(probe_latencies):8.1f} ms"
+          f"  max {max(probe_latencies):8.1f} ms  ({len(probe_latencies)} probes)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--db-url", default=None, help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.TemporaryDirectory()
+    db_url = args.db_url or f"sqlite:///{os.path.join(tmpdir.name, 'auth.db')}"
+    engine = create_engine(db_url)
+    SQLModel.metadata.create_all(engine, tables=[User.__table__])
+    with Session(engine) as session:
+        user = User(username=f"bench-{time.time_ns()}", hashed_password=get_password_hash("password"))
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+    print(f"token resolution ({args.requests} requests, {engine.dialect.name}):")
+    asyncio.run(bench_resolver(db_url, user, args.requests))
+
+    print(f"login burst ({args.logins} concurrent bcrypt verifications):")
+    for offload in (False, True):
+        asyncio.run(bench_logins(user.hashed_password, args.logins, offload))
+
+    if args.db_url:
+        with Session(engine) as session:
+            session.delete(session.get(User, user.id))
+            session.commit()
+    tmpdir.cleanup()
+
+if __name__ == "__main__":
+    main()
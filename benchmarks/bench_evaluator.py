@@ -0,0 +1,275 @@
+"""Benchmark: AsyncEvaluator end to end against the local stub server.
+
+Starts app.stub_server in a child process (so its work doesn't share our event
+loop or memory), writes a synthetic JSONL dataset, ingests it like an
+upload and runs one task through AsyncEvaluator against SQLite or a local
+MySQL. Prints one JSON report: samples/sec, event-loop lag, peak RSS, result
+write rate and per-sample overhead, i.e. time spent in the evaluator outside
+the request/retry loop (in batch mode that includes waiting for the batch).
+
+The response cache is off and concurrency is fixed (no adaptive limiter)
+unless --adaptive is given, so runs are comparable.
+
+Usage: python -m benchmarks.bench_evaluator [--samples N] [--concurrency N] [--mode chat|stream|batch]
+                                            [--latency-ms 20] [--latency-dist fixed|exponential|lognormal]
+                                            [--error-rate 0] [--tail-tokens 50] [--db-url URL] [--output FILE]
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from aiohttp import ClientError, ClientSession, web
+from app.stub_server import StubServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = "the of and to in is we so then therefore compute value result step".split()
+
+# Time spent in _request_with_retries by the sample being processed
+_request_ms = contextvars.ContextVar("request_ms", default=None)
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def summary(values):
+    return {
+        "p50": percentile(values, 0.50),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+        "mean": statistics.fmean(values) if values else None,
+    }
+
+def write_dataset(path, n, seed=0):
+    # The stub answers with the prompt's last line, so answers equal questions
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            question = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))) + f" {i}"
+            f.write(json.dumps({"q": question, "a": question}) + "\n")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def serve_stub(port, options):
+    async def make_app():
+        return StubServer(**options).app()
+
+    web.run_app(make_app(), host="127.0.0.1", port=port, print=None)
+
+async def wait_for_stub(url, proc, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    async with ClientSession() as session:
+        while time.monotonic() < deadline:
+            if not proc.is_alive():
+                raise RuntimeError("stub server exited")
+            try:
+                async with session.get(f"{url}/stats") as resp:
+                    return await resp.json()
+            except ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("stub server did not start")
+
+async def stub_stats(url):
+    async with ClientSession() as session:
+        async with session.get(f"{url}/stats") as resp:
+            return await resp.json()
+
+async def sample_loop_lag(lags, stop, interval=0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, (time.perf_counter() - start - interval) * 1000))
+
+def make_evaluator_class():
+    from app.core.evaluator import AsyncEvaluator
+
+    class TimedEvaluator(AsyncEvaluator):
+        """Records how long each sample spends outside the request/retry loop."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.overheads_ms = []
+
+        async def process_single_sample(self, *args, **kwargs):
+            spent = []
+            _request_ms.set(spent)
+            start = time.perf_counter()
+            result = await super().process_single_sample(*args, **kwargs)
+            self.overheads_ms.append((time.perf_counter() - start) * 1000 - sum(spent))
+            return result
+
+        async def _request_with_retries(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await super()._request_with_retries(*args, **kwargs)
+            finally:
+                spent = _request_ms.get()
+                if spent is not None:
+                    spent.append((time.perf_counter() - start) * 1000)
+
+    return TimedEvaluator
+
+async def run_task(args, stub_url, dataset_path, storage_dir):
+    from sqlmodel import Session, delete
+    from app.database import close_async_engine, engine, init_db
+    from app.models import Dataset, DatasetSample, EvaluationLog, EvaluationResult, LLMModel
+    from app.core.dataset import ingest_file
+    from app.core.http_client import http_clients
+
+    init_db()
+    name = f"bench-{time.time_ns()}"
+    stored = ingest_file(dataset_path, storage_dir, 1 << 20)
+    with Session(engine) as session:
+        model = LLMModel(
+            name=name, api_base_url=f"{stub_url}/v1", api_key="bench", model_name_identifier="stub",
+            concurrency_limit=args.concurrency, batch_size=args.batch_size if args.mode == "batch" else 1,
+            stream=args.mode == "stream",
+        )
+        dataset = Dataset(
+            name=name, file_path=stored.file_path, samples_path=stored.samples_path,
+            index_path=stored.index_path, content_hash=stored.content_hash, total_count=stored.line_count,
+        )
+        session.add(model)
+        session.add(dataset)
+        session.commit()
+        task = EvaluationLog(model_id=model.id, dataset_id=dataset.id, use_cache=False)
+        session.add(task)
+        session.commit()
+        ids = model.id, dataset.id, task.id
+
+    evaluator = make_evaluator_class()(ids[2])
+    lags = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_loop_lag(lags, stop))
+    start = time.perf_counter()
+    await evaluator.run()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    with Session(engine) as session:
+        status = session.get(EvaluationLog, ids[2]).status
+    processed = evaluator.aggregates.processed
+    sink = evaluator.sink.stats()
+    report = {
+        "status": status,
+        "elapsed_s": elapsed,
+        "samples": processed,
+        "samples_per_sec": processed / elapsed if elapsed else None,
+        "accuracy": evaluator.aggregates.snapshot()["accuracy"],
+        "retries": evaluator.retries,
+        "errors": evaluator.aggregates.errors,
+        "event_loop_lag_ms": summary(lags),
+        "overhead_ms": summary(evaluator.overheads_ms),
+        "latency_ms": {
+            "p50": evaluator.aggregates.latency.quantile(0.50),
+            "p99": evaluator.aggregates.latency.quantile(0.99),
+        },
+        "db": {
+            "dialect": engine.dialect.name,
+            "rows_written": sink["rows_written"],
+            "rows_per_sec": sink["rows_written"] / elapsed if elapsed else None,
+            "flushes": sink["flush_count"],
+            "avg_flush_ms": sink["avg_flush_ms"],
+            "max_flush_ms": sink["max_flush_ms"],
+        },
+    }
+
+    if args.db_url:
+        # Leave a shared database as it was
+        with Session(engine) as session:
+            session.exec(delete(EvaluationResult).where(EvaluationResult.task_id == ids[2]))
+            session.exec(delete(EvaluationLog).where(EvaluationLog.id == ids[2]))
+            session.exec(delete(DatasetSample).where(DatasetSample.dataset_id == ids[1]))
+            session.exec(delete(Dataset).where(Dataset.id == ids[1]))
+            session.exec(delete(LLMModel).where(LLMModel.id == ids[0]))
+            session.commit()
+    await http_clients.close()
+    await close_async_engine()
+    return report
+
+async def run(args, dataset_path, storage_dir):
+    port = free_port()
+    stub_url = f"http://127.0.0.1:{port}"
+    options = {
+        "latency_ms": args.latency_ms, "per_item_ms": args.per_item_ms, "slots": args.slots,
+        "token_ms": args.token_ms, "tail_tokens": args.tail_tokens, "latency_dist": args.latency_dist,
+        "error_rate": args.error_rate, "seed": 0,
+    }
+    proc = multiprocessing.Process(target=serve_stub, args=(port, options), daemon=True)
+    proc.start()
+    try:
+        await wait_for_stub(stub_url, proc)
+        report = await run_task(args, stub_url, dataset_path, storage_dir)
+        report["stub"] = await stub_stats(stub_url)
+    finally:
+        proc.terminate()
+        proc.join()
+    return report
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64, help="Model concurrency_limit")
+    parser.add_argument("--mode", choices=("chat", "stream", "batch"), default="chat")
+    parser.add_argument("--batch-size", type=int, default=16, help="Prompts per request in batch mode")
+    parser.add_argument("--adaptive", action="store_true", help="Keep the adaptive concurrency limiter on")
+    parser.add_argument("--slots", type=int, default=256, help="Requests the stub serves concurrently")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-dist", choices=("fixed", "exponential", "lognormal"), default="fixed")
+    parser.add_argument("--per-item-ms", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Delay per streamed token")
+    parser.add_argument("--tail-tokens", type=int, default=50, help="Filler words per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--db-url", default=None, help="e.g. a local MySQL; defaults to a temporary SQLite file")
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Settings are read at import, so the environment is set before app is imported
+        os.environ["DATABASE_URL"] = args.db_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+        os.environ["ADAPTIVE_CONCURRENCY"] = "true" if args.adaptive else "false"
+        dataset_path = os.path.join(tmpdir, "dataset.jsonl")
+        write_dataset(dataset_path, args.samples)
+        report = asyncio.run(run(args, dataset_path, tmpdir))
+
+    report = {
+        "benchmark": "evaluator",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "config": vars(args),
+        **report,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
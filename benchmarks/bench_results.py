@@ -0,0 +1,158 @@
+"""Benchmark: EvaluationResult insert rate, table size and query latency per storage layout.
+
+"inline" stores question/ground_truth on every result and raw outputs as
+plain text (the layout before DatasetSample); "shared" stores the text once
+per dataset line and zlib-compresses raw outputs. Rows are spread over tasks
+of --dataset-lines samples each, inserted in ResultSink-sized batches.
+
+Queries timed: a keyset page with question text halfway through a task, the
+first page of incorrect results, and the paired diff summary of two tasks.
+
+Usage: python -m benchmarks.bench_results [--rows N] [--dataset-lines N] [--db-url URL]
+
+--db-url must point at an empty scratch database: tables are created and
+dropped per layout. The default is a temporary SQLite file per layout.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from sqlalchemy import insert, inspect, text
+from sqlmodel import SQLModel, Session, create_engine
+from app.config import get_settings
+from app.models import Dataset, DatasetSample, EvaluationLog, EvaluationResult, LLMModel
+from app.core.compression import encode_text
+from app.core.diff import compute_diff
+from app.core.results import parse_fields, results_query
+
+settings = get_settings()
+
+BATCH_SIZE = 5000
+TABLES = [LLMModel.__table__, Dataset.__table__, DatasetSample.__table__, EvaluationLog.__table__, EvaluationResult.__table__]
+WORDS = ("the of and to in is we so then therefore compute value result step "
+         "first next multiply add subtract divide total check answer because").split()
+
+def make_lines(n, rng):
+    lines = []
+    for i in range(n):
+        question = " ".join(rng.choice(WORDS) for _ in range(60)) + f" #{i}?"
+        answer = str(rng.randint(0, 1000))
+        lines.append((question, answer))
+    return lines
+
+def make_outputs(n, rng):
+    # A pool of distinct reasoning traces; each row is still compressed on its own
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(80, 300))) for _ in range(n)]
+
+def table_bytes(engine, path):
+    if path:
+        return os.path.getsize(path)
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE TABLE evaluationresult, datasetsample"))
+        return conn.execute(text(
+            "SELECT SUM(data_length + index_length) FROM information_schema.tables"
+            " WHERE table_schema = DATABASE() AND table_name IN ('evaluationresult', 'datasetsample')"
+        )).scalar()
+
+def timed(fn, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def run_layout(layout, engine, path, rows, lines, outputs):
+    shared = layout == "shared"
+    SQLModel.metadata.create_all(engine, tables=TABLES)
+    with Session(engine) as session:
+        model = LLMModel(name="bench", api_base_url="http://localhost", api_key="", model_name_identifier="bench")
+        dataset = Dataset(name="bench", file_path="", total_count=len(lines), samples_stored=shared)
+        session.add(model)
+        session.add(dataset)
+        session.commit()
+        n_tasks = max(2, -(-rows // len(lines)))
+        tasks = [EvaluationLog(model_id=model.id, dataset_id=dataset.id) for _ in range(n_tasks)]
+        session.add_all(tasks)
+        session.commit()
+        task_ids = [task.id for task in tasks]
+        if shared:
+            for start in range(0, len(lines), BATCH_SIZE):
+                session.execute(insert(DatasetSample), [
+                    {"dataset_id": dataset.id, "line_index": i, "question": q, "ground_truth": a}
+                    for i, (q, a) in enumerate(lines[start:start + BATCH_SIZE], start)
+                ])
+            session.commit()
+
+    rng = random.Random(1)
+    written = 0
+    insert_s = 0.0
+    while written < rows:
+        batch = []
+        for n in range(written, min(written + BATCH_SIZE, rows)):
+            line = n % len(lines)
+            question, answer = lines[line]
+            correct = rng.random() < 0.7
+            output = f"{rng.choice(outputs)}\nanswer: {answer if correct else rng.randint(0, 1000)}"
+            batch.append({
+                "task_id": task_ids[n // len(lines)],
+                "sample_index": line,
+                "question": None if shared else question,
+                "ground_truth": None if shared else answer,
+                # Encoded here so the layout doesn't depend on RESULT_COMPRESS_OUTPUT
+                "raw_output": encode_text(output, shared, settings.RESULT_COMPRESS_MIN_BYTES),
+                "extracted_answer": answer,
+                "is_correct": correct,
+                "instruction_followed": True,
+                "latency_ms": rng.uniform(200, 2000),
+                "tokens_used": rng.randint(100, 600),
+                "stopped_early": False,
+            })
+        start = time.perf_counter()
+        with Session(engine) as session:
+            session.execute(insert(EvaluationResult), batch)
+            session.commit()
+        insert_s += time.perf_counter() - start
+        written += len(batch)
+
+    size = table_bytes(engine, path)
+    task_a, task_b = task_ids[0], task_ids[1]
+    with Session(engine) as session:
+        middle = session.execute(
+            text("SELECT MIN(id) + :half FROM evaluationresult WHERE task_id = :task"),
+            {"half": len(lines) // 2, "task": task_a},
+        ).scalar()
+        fields = parse_fields("question,ground_truth,raw_output,is_correct")
+        page = timed(lambda: session.execute(results_query(task_a, fields, after=middle).limit(100)).all())
+        incorrect = timed(lambda: session.execute(results_query(task_a, fields, is_correct=False).limit(100)).all())
+        diff = timed(lambda: compute_diff(session, task_a, task_b), repeat=5)
+
+    print(f"  {layout:<7} insert {rows / insert_s:10,.0f} rows/s   size {size / 2**20:9.1f} MiB "
+          f"({size / rows:6.0f} B/row)   page {page:7.2f} ms   incorrect {incorrect:7.2f} ms   diff {diff:8.1f} ms")
+    SQLModel.metadata.drop_all(engine, tables=TABLES)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--dataset-lines", type=int, default=100_000)
+    parser.add_argument("--db-url", default=None, help="Empty scratch database; defaults to temporary SQLite files")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    lines = make_lines(min(args.dataset_lines, args.rows), rng)
+    outputs = make_outputs(1000, rng)
+    print(f"{args.rows:,} results over {len(lines):,}-line tasks (compression from {settings.RESULT_COMPRESS_MIN_BYTES} bytes):")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for layout in ("inline", "shared"):
+            path = None if args.db_url else os.path.join(tmpdir, f"{layout}.db")
+            engine = create_engine(args.db_url or f"sqlite:///{path}")
+            existing = set(inspect(engine).get_table_names()) & {table.name for table in TABLES}
+            if existing:
+                parser.error(f"--db-url already has tables {sorted(existing)}; use an empty scratch database")
+            run_layout(layout, engine, path, args.rows, lines, outputs)
+            engine.dispose()
+
+if __name__ == "__main__":
+    main()
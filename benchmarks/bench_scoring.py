@@ -0,0 +1,51 @@
+"""Micro-benchmark: per-sample scoring vs. score_batch.
+
+Usage: python -m benchmarks.bench_scoring [--rows N]
+"""
+import argparse
+import random
+import time
+from app.core.scoring import score, score_batch
+
+def make_rows(n, seed=0):
+    rng = random.Random(seed)
+    words = "the of and to in is we so then therefore compute value result step".split()
+    raws, gts = [], []
+    for _ in range(n):
+        reasoning = " ".join(rng.choice(words) for _ in range(rng.randint(20, 120)))
+        gt = str(rng.randint(0, 1000))
+        kind = rng.random()
+        if kind < 0.85:
+            answer = gt if rng.random() < 0.7 else str(rng.randint(0, 1000))
+            raw = f"{reasoning}\nAnswer: {answer}\n"
+        elif kind < 0.95:
+            raw = f"{reasoning} so the result is \\boxed{{{gt}}}"
+        else:
+            raw = reasoning
+        raws.append(raw)
+        gts.append(gt)
+    return raws, gts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    raws, gts = make_rows(args.rows)
+
+    start = time.perf_counter()
+    per_sample = [score(raw, gt) for raw, gt in zip(raws, gts)]
+    per_sample_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extracted, correct, followed = score_batch(raws, gts)
+    batch_s = time.perf_counter() - start
+
+    assert per_sample == list(zip(extracted, correct, followed))
+    print(f"rows:        {args.rows}")
+    print(f"per-sample:  {per_sample_s:.2f}s ({args.rows / per_sample_s:,.0f} rows/s)")
+    print(f"score_batch: {batch_s:.2f}s ({args.rows / batch_s:,.0f} rows/s)")
+    print(f"speedup:     {per_sample_s / batch_s:.1f}x")
+
+if __name__ == "__main__":
+    main()
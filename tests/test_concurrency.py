@@ -0,0 +1,116 @@
+import asyncio
+import time
+from app.core.concurrency import AdaptiveLimiter, parse_retry_after
+
+def test_acquire_blocks_at_limit():
+    async def main():
+        limiter = AdaptiveLimiter(2)
+        await limiter.acquire()
+        await limiter.acquire()
+        third = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        assert limiter.stats()["waiting"] == 1
+        limiter.release()
+        await asyncio.wait_for(third, 1)
+        assert limiter.in_flight == 2
+
+    asyncio.run(main())
+
+def test_cancel_during_retry_after_pause_holds_no_slot():
+    async def main():
+        limiter = AdaptiveLimiter(1)
+        limiter.on_overload(retry_after=10)
+        acquiring = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        acquiring.cancel()
+        await asyncio.gather(acquiring, return_exceptions=True)
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+def test_acquire_waits_out_retry_after():
+    async def main():
+        limiter = AdaptiveLimiter(1)
+        limiter.on_overload(retry_after=0.05)
+        start = time.monotonic()
+        await limiter.acquire()
+        assert time.monotonic() - start >= 0.05
+        assert limiter.in_flight == 1
+
+    asyncio.run(main())
+
+def test_cancelled_waiter_passes_slot_on():
+    async def main():
+        limiter = AdaptiveLimiter(1)
+        await limiter.acquire()
+        first = asyncio.create_task(limiter.acquire())
+        second = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        # Wake the first waiter and cancel it before it gets to run
+        limiter.release()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, 1)
+        assert limiter.in_flight == 1
+        assert limiter.stats()["waiting"] == 0
+
+    asyncio.run(main())
+
+def test_cancelled_waiters_leave_the_queue():
+    async def main():
+        limiter = AdaptiveLimiter(1)
+        await limiter.acquire()
+        waiters = [asyncio.create_task(limiter.acquire()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert limiter.stats()["waiting"] == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+def test_success_grows_limit_up_to_max():
+    limiter = AdaptiveLimiter(2, max_limit=4)
+    for _ in range(50):
+        limiter.on_success(100)
+    assert limiter.stats()["limit"] == 4
+
+def test_slow_success_holds_limit():
+    limiter = AdaptiveLimiter(2, max_limit=10)
+    limiter.on_success(100)
+    before = limiter.limit
+    for _ in range(20):
+        limiter.on_success(500)
+    assert limiter.limit == before
+
+def test_latency_baseline_is_windowed():
+    limiter = AdaptiveLimiter(2, max_limit=100, baseline_window=10)
+    limiter.on_success(10)
+    for _ in range(9):
+        limiter.on_success(100)
+    assert limiter.min_latency_ms == 10
+    # The fast outlier drops out of the window and steady latency counts as normal again
+    limiter.on_success(100)
+    assert limiter.min_latency_ms == 100
+    before = limiter.limit
+    limiter.on_success(100)
+    assert limiter.limit > before
+
+def test_overload_halves_once_per_window():
+    limiter = AdaptiveLimiter(8, min_limit=3)
+    limiter.on_overload()
+    limiter.on_overload()
+    assert limiter.stats()["limit"] == 4
+    assert limiter.overloads == 2
+    limiter._next_decrease = 0.0
+    limiter.on_overload()
+    assert limiter.stats()["limit"] == 3
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
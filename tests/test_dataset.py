@@ -0,0 +1,61 @@
+import json
+import pytest
+from app.core.dataset import DatasetReader, DatasetSchemaError, DatasetWriter, ingest_file
+
+def write(tmp_path, lines):
+    writer = DatasetWriter(str(tmp_path / "d.samples"), str(tmp_path / "d.idx"))
+    for line in lines:
+        writer.add_line(line.encode("utf-8"))
+    writer.close()
+    return DatasetReader(str(tmp_path / "d.samples"), str(tmp_path / "d.idx"))
+
+def test_round_trip(tmp_path):
+    rows = [
+        {"q": "What is 2+2?", "a": "4"},
+        {"q": "Ünïcödé ✓ 字", "a": "ß", "subject": "lang", "tags": ["x", "y"]},
+        {"q": "", "a": ""},
+    ]
+    with write(tmp_path, [json.dumps(row, ensure_ascii=False) for row in rows]) as reader:
+        assert len(reader) == 3
+        assert [reader.get(i) for i in range(3)] == rows
+
+def test_blank_lines_keep_line_numbers(tmp_path):
+    lines = ['{"q": "a", "a": "1"}', "", "   ", '{"q": "b", "a": "2"}']
+    with write(tmp_path, lines) as reader:
+        assert len(reader) == 4
+        assert reader.get(1) is None and reader.get(2) is None
+        assert list(reader.iter()) == [(0, {"q": "a", "a": "1"}), (3, {"q": "b", "a": "2"})]
+
+def test_numeric_and_missing_answers(tmp_path):
+    lines = ['{"q": "n", "a": 42}', '{"q": "f", "a": 1.5}', '{"q": "missing"}', '{"q": "null", "a": null}']
+    with write(tmp_path, lines) as reader:
+        assert [reader.get(i)["a"] for i in range(4)] == ["42", "1.5", "", ""]
+
+def test_iter_range(tmp_path):
+    lines = [json.dumps({"q": str(i), "a": str(i)}) for i in range(10)]
+    with write(tmp_path, lines) as reader:
+        assert [index for index, _ in reader.iter(3, 6)] == [3, 4, 5]
+        assert [index for index, _ in reader.iter(8, 100)] == [8, 9]
+
+def test_invalid_lines_are_reported(tmp_path):
+    writer = DatasetWriter(str(tmp_path / "d.samples"), str(tmp_path / "d.idx"))
+    for line in ['{"q": "ok", "a": "1"}', "not json", "[1, 2]", '{"a": "no question"}', '{"q": "x", "a": true}']:
+        writer.add_line(line.encode("utf-8"))
+    with pytest.raises(DatasetSchemaError) as excinfo:
+        writer.close()
+    assert [error["line"] for error in excinfo.value.errors] == [2, 3, 4, 5]
+
+def test_empty_dataset(tmp_path):
+    with write(tmp_path, []) as reader:
+        assert len(reader) == 0
+        assert list(reader.iter()) == []
+
+def test_ingest_stores_by_content(tmp_path):
+    source = tmp_path / "upload.jsonl"
+    source.write_text('{"q": "a", "a": "1"}\n{"q": "b"}', encoding="utf-8")
+    first = ingest_file(str(source), str(tmp_path / "store"), 7)
+    second = ingest_file(str(source), str(tmp_path / "store"), 1 << 20)
+    assert first == second
+    assert first.line_count == 2
+    with DatasetReader(first.samples_path, first.index_path) as reader:
+        assert list(reader.iter()) == [(0, {"q": "a", "a": "1"}), (1, {"q": "b", "a": ""})]
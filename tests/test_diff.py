@@ -0,0 +1,103 @@
+import math
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+from app.core.diff import MCNEMAR_EXACT_LIMIT, _paired, compute_diff, mcnemar
+from app.models import Dataset, EvaluationLog, EvaluationResult, LLMModel
+
+def exact_mcnemar(regressed, improved):
+    n = regressed + improved
+    k = min(regressed, improved)
+    return min(1.0, 2 * sum(math.comb(n, i) for i in range(k + 1)) / 2 ** n)
+
+def test_mcnemar_no_discordant_pairs():
+    assert mcnemar(0, 0) == 1.0
+
+def test_mcnemar_exact_small_samples():
+    assert mcnemar(0, 5) == pytest.approx(2 / 32)
+    assert mcnemar(5, 0) == pytest.approx(2 / 32)
+    assert mcnemar(1, 4) == pytest.approx(12 / 32)
+    assert mcnemar(0, 1) == 1.0
+    # The doubled tail is capped at 1 when the split is even
+    assert mcnemar(3, 3) == 1.0
+    assert mcnemar(2, 10) == pytest.approx(158 / 4096)
+
+def test_mcnemar_chi_square_above_exact_limit():
+    regressed, improved = 520, 580
+    assert regressed + improved > MCNEMAR_EXACT_LIMIT
+    chi2 = (abs(regressed - improved) - 1) ** 2 / (regressed + improved)
+    assert mcnemar(regressed, improved) == pytest.approx(math.erfc(math.sqrt(chi2 / 2)))
+    # Continuity-corrected chi-square tracks the exact test at this size
+    assert mcnemar(regressed, improved) == pytest.approx(exact_mcnemar(regressed, improved), rel=0.05)
+    assert mcnemar(580, 520) == mcnemar(520, 580)
+
+def test_paired_edge_cases():
+    assert _paired(0, 0, 0) == {"mean": None, "std": None, "p_value": None}
+    assert _paired(1, 5, 25) == {"mean": 5.0, "std": 0.0, "p_value": 0.0}
+    assert _paired(3, 0, 0) == {"mean": 0.0, "std": 0.0, "p_value": 1.0}
+    # Deltas 1, 2, 3: mean 2, sample std 1
+    stats = _paired(3, 6, 14)
+    assert stats["mean"] == 2.0
+    assert stats["std"] == pytest.approx(1.0)
+    assert stats["p_value"] == pytest.approx(math.erfc(2 * math.sqrt(3) / math.sqrt(2)))
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'diff.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        model = LLMModel(name="m", api_base_url="http://x", api_key="k", model_name_identifier="m")
+        dataset = Dataset(name="d", file_path="d.jsonl", total_count=6)
+        session.add_all([model, dataset])
+        session.commit()
+        for _ in range(2):
+            session.add(EvaluationLog(model_id=model.id, dataset_id=dataset.id))
+        session.commit()
+        yield session
+    engine.dispose()
+
+def add_result(session, task_id, index, correct, latency=100.0, tokens=10, raw_output="answer: x"):
+    session.add(EvaluationResult(
+        task_id=task_id, sample_index=index, is_correct=correct,
+        latency_ms=latency, tokens_used=tokens, completion_tokens=tokens, raw_output=raw_output,
+    ))
+
+def test_compute_diff_pairs_on_sample_index(session):
+    # Line 4 only ran on task 1 and line 5 only on task 2: neither is paired
+    for index, correct in [(0, True), (1, True), (2, False), (3, False), (4, True)]:
+        add_result(session, 1, index, correct)
+    for index, correct in [(0, True), (1, False), (2, True), (3, False), (5, False)]:
+        add_result(session, 2, index, correct, latency=150.0, tokens=12)
+    session.commit()
+
+    diff = compute_diff(session, 1, 2)
+    assert diff["paired_samples"] == 4
+    assert (diff["both_correct"], diff["both_incorrect"], diff["regressed"], diff["improved"]) == (1, 1, 1, 1)
+    assert diff["accuracy_a"] == diff["accuracy_b"] == 0.5
+    assert diff["mcnemar_p_value"] == 1.0
+    assert diff["latency_delta_ms"]["mean"] == 50.0
+    assert diff["tokens_delta"] == {"mean": 2.0, "std": 0.0, "p_value": 0.0}
+
+def test_compute_diff_counts_errors_as_incorrect(session):
+    for index in range(3):
+        add_result(session, 1, index, True)
+    # Failed requests are stored as incorrect rows with no tokens
+    for index in range(3):
+        add_result(session, 2, index, False, latency=0.0, tokens=0, raw_output="Error: 503 - unavailable")
+    session.commit()
+
+    diff = compute_diff(session, 1, 2)
+    assert diff["paired_samples"] == 3
+    assert diff["regressed"] == 3 and diff["improved"] == 0
+    assert diff["accuracy_b"] == 0.0
+    assert diff["mcnemar_p_value"] == pytest.approx(2 / 8)
+
+def test_compute_diff_without_overlap(session):
+    add_result(session, 1, 0, True)
+    add_result(session, 2, 1, True)
+    session.commit()
+
+    diff = compute_diff(session, 1, 2)
+    assert diff["paired_samples"] == 0
+    assert diff["accuracy_a"] is None and diff["accuracy_b"] is None
+    assert diff["mcnemar_p_value"] == 1.0
+    assert diff["latency_delta_ms"] == {"mean": None, "std": None, "p_value": None}
@@ -0,0 +1,38 @@
+import asyncio
+from app.core.http_client import ClientRegistry
+
+URL = "http://127.0.0.1:9/v1"
+
+def test_pool_sized_to_models_sharing_endpoint():
+    async def main():
+        registry = ClientRegistry()
+        a = await registry.acquire(URL, 1, 8)
+        a2 = await registry.acquire(URL, 1, 8)
+        assert a is a2 and a.connector.limit == 8
+        b = await registry.acquire(URL, 2, 4)
+        assert b is not a and b.connector.limit == 12
+        for session in (a, a2, b):
+            await registry.release(URL, 1 if session is not b else 2, session)
+        await registry.close()
+
+    asyncio.run(main())
+
+def test_retired_session_closed_after_last_user():
+    async def main():
+        registry = ClientRegistry()
+        a = await registry.acquire(URL, 1, 8)
+        a2 = await registry.acquire(URL, 1, 8)
+        b = await registry.acquire(URL, 2, 4)
+        await registry.release(URL, 1, a)
+        assert not a.closed
+        await registry.release(URL, 1, a2)
+        assert a.closed
+        # The current session stays open for reuse
+        await registry.release(URL, 2, b)
+        assert not b.closed
+        c = await registry.acquire(URL, 3, 30)
+        assert c.connector.limit == 30 and b.closed
+        await registry.release(URL, 3, c)
+        await registry.close()
+
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+import json
+import pytest
+from app.core.prompts import PromptTemplate, RequestBuilder
+
+def test_render_fields_and_literal_braces():
+    template = PromptTemplate("{{x}} Q: {q!r} n={n:.2f}")
+    assert template.fields == ["q", "n"]
+    assert template.render({"q": "hi", "n": 1.5}) == "{x} Q: 'hi' n=1.50"
+
+def test_missing_field_renders_empty_even_with_spec():
+    assert PromptTemplate("[{n:.2f}|{q}]").render({}) == "[|]"
+
+def test_spec_not_matching_value_raises():
+    with pytest.raises(ValueError):
+        PromptTemplate("{n:.2f}").render({"n": "text"})
+
+def test_invalid_templates_rejected():
+    for template in ("{", "{0}", "{a.b}", "{}"):
+        with pytest.raises(ValueError):
+            PromptTemplate(template)
+
+def test_chat_body_matches_plain_json():
+    builder = RequestBuilder(
+        "m", system_prompt="Subject: {subject}", user_template="Q: {q}",
+        few_shot=[{"user": "1+1", "assistant": "answer: 2"}], generation_params={"temperature": 0.5},
+    )
+    row = {"q": 'say "hi"\n', "subject": "ünï"}
+    body = json.loads(builder.chat_body(builder.messages(row)))
+    assert body == {
+        "model": "m",
+        "messages": [
+            {"role": "system", "content": "Subject: ünï"},
+            {"role": "user", "content": "1+1"},
+            {"role": "assistant", "content": "answer: 2"},
+            {"role": "user", "content": 'Q: say "hi"\n'},
+        ],
+        "temperature": 0.5,
+        "max_tokens": 1024,
+    }
+    assert not builder.deterministic
+
+def test_reserved_generation_params_rejected():
+    with pytest.raises(ValueError):
+        RequestBuilder("m", generation_params={"stream": True})
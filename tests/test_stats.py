@@ -0,0 +1,113 @@
+import json
+import math
+import random
+import pytest
+from app.core.stats import MAX_GROUPS_PER_FIELD, OTHER_GROUP, LogHistogram, RunningStats
+
+def make_samples(n, seed=0):
+    rng = random.Random(seed)
+    samples = []
+    for i in range(n):
+        samples.append({
+            "is_correct": rng.random() < 0.6,
+            "instruction_followed": rng.random() < 0.9,
+            "latency_ms": rng.lognormvariate(6, 1),
+            "tokens": rng.randint(0, 800),
+            "cached": rng.random() < 0.2,
+            "error": rng.choice([None, None, None, "http_429", "exception"]),
+            "groups": {"subject": [rng.choice("abcde")]},
+            "ttft_ms": rng.uniform(10, 500) if i % 2 else None,
+        })
+    return samples
+
+def add_all(stats, samples):
+    for s in samples:
+        stats.add(
+            s["is_correct"], s["instruction_followed"], s["latency_ms"], s["tokens"],
+            cached=s["cached"], error=s["error"], groups=s["groups"], ttft_ms=s["ttft_ms"],
+            cache_miss=not s["cached"],
+        )
+    return stats
+
+def exact_quantile(values, q):
+    # Same rank convention as LogHistogram.quantile
+    ordered = sorted(values)
+    return ordered[math.floor(q * (len(ordered) - 1))]
+
+def test_histogram_quantiles_within_relative_accuracy():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(5, 2) for _ in range(5000)] + [0.0] * 50
+    hist = LogHistogram(0.01)
+    for v in values:
+        hist.add(v)
+    for q in (0.0, 0.1, 0.5, 0.9, 0.99, 1.0):
+        expected = exact_quantile(values, q)
+        assert abs(hist.quantile(q) - expected) <= 0.01 * expected + 1e-12
+
+def test_histogram_merge_equals_single_stream():
+    rng = random.Random(2)
+    values = [rng.expovariate(0.01) for _ in range(3000)]
+    whole = LogHistogram()
+    parts = [LogHistogram() for _ in range(3)]
+    for i, v in enumerate(values):
+        whole.add(v)
+        parts[i % 3].add(v)
+    merged = LogHistogram()
+    for part in parts:
+        merged.merge(part)
+    assert merged.to_dict() == whole.to_dict()
+
+def test_merged_stats_match_one_stream():
+    samples = make_samples(2000)
+    whole = add_all(RunningStats(), samples)
+    merged = RunningStats()
+    for start in range(0, len(samples), 700):
+        merged.merge(add_all(RunningStats(), samples[start:start + 700]))
+
+    for key in ("processed", "correct", "instruction_followed", "total_tokens", "cache_hits", "cache_misses"):
+        assert getattr(merged, key) == getattr(whole, key)
+    assert math.isclose(merged.total_latency, whole.total_latency)
+    assert merged.errors == whole.errors
+    assert merged.groups == whole.groups
+    latencies = [s["latency_ms"] for s in samples]
+    for q in (0.5, 0.95, 0.99):
+        expected = exact_quantile(latencies, q)
+        assert abs(merged.latency.quantile(q) - expected) <= merged.latency.relative_accuracy * expected
+    merged_snapshot, whole_snapshot = merged.snapshot(), whole.snapshot()
+    for key in merged_snapshot:
+        assert merged_snapshot[key] == pytest.approx(whole_snapshot[key])
+
+def test_round_trip_through_json():
+    stats = add_all(RunningStats(), make_samples(500))
+    restored = RunningStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+    assert restored.to_dict() == stats.to_dict()
+    assert restored.report() == stats.report()
+
+def test_from_dict_accepts_legacy_summaries():
+    stats = add_all(RunningStats(), make_samples(100))
+    legacy = stats.to_dict()
+    for key in ("tokens", "ttft", "cache_misses", "errors", "groups"):
+        del legacy[key]
+    restored = RunningStats.from_dict(legacy)
+    assert restored.processed == stats.processed
+    assert restored.latency.to_dict() == stats.latency.to_dict()
+    assert restored.tokens.count == 0 and restored.ttft.count == 0
+    assert restored.cache_misses == 0
+    assert restored.errors == {} and restored.groups == {}
+
+def test_group_overflow_on_merge():
+    a, b = RunningStats(), RunningStats()
+    for i in range(MAX_GROUPS_PER_FIELD):
+        a.add(True, True, 1.0, 1, groups={"subject": [f"s{i}"]})
+    for i in range(MAX_GROUPS_PER_FIELD - 5, MAX_GROUPS_PER_FIELD + 10):
+        b.add(i % 2 == 0, True, 1.0, 1, groups={"subject": [f"s{i}"]})
+    a.merge(b)
+
+    subjects = a.groups["subject"]
+    assert len(subjects) == MAX_GROUPS_PER_FIELD + 1
+    # Values already tracked keep counting; the 10 new ones land in the overflow group
+    for i in range(MAX_GROUPS_PER_FIELD - 5, MAX_GROUPS_PER_FIELD):
+        assert subjects[f"s{i}"] == [2, 1 + (i % 2 == 0)]
+    overflow = range(MAX_GROUPS_PER_FIELD, MAX_GROUPS_PER_FIELD + 10)
+    assert subjects[OTHER_GROUP] == [10, sum(1 for i in overflow if i % 2 == 0)]
+    assert sum(samples for samples, _ in subjects.values()) == a.processed